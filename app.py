@@ -17,11 +17,13 @@ from omegaconf import DictConfig, OmegaConf
 load_dotenv()
 
 from config import Config  # noqa: E402
+from zp_tool.items import backfill_projection, compress_details  # noqa: E402
+from zp_tool.main import bench_validators  # noqa: E402
 from zp_tool.main import main as crawl_main  # noqa: E402
+from zp_tool.sanitizer_bench import bench_sanitizer  # noqa: E402
+from zp_tool.storage import ship_upstream  # noqa: E402
 from zp_tool.user_client import UserClient  # noqa: E402
 
-tracemalloc.start()
-
 
 @dataclass
 class AppConfig:
@@ -38,6 +40,14 @@ class AppConfig:
     degree: str = ""
     scale: str = ""
     proxy: str = ""
+    sanitizer_cache_entries: int = 0
+    sanitizer_cache_mb: int = 64
+    sanitize_workers: int = 0
+    storage: str = "mongo"
+    compress_detail: bool = False
+    greet_order: str = "-last_inspection_time"
+    detail_ttl_hours: float = 24
+    shard: str = ""
     hydra: Any = field(default_factory=dict)
 
 
@@ -69,30 +79,35 @@ def formatter(record: Any) -> str:
     return fmt + "\n"
 
 
-logger.remove()
+def setup_logging() -> None:
+    # Called from the entry point only: spawned DataSanitizer workers import
+    # this module as __mp_main__ and must not open the log files again.
+    tracemalloc.start()
 
-logger.add(
-    sys.stdout,
-    format=formatter,
-    level="INFO",
-    colorize=True,
-    enqueue=True,
-    backtrace=True,
-    diagnose=True,
-)
+    logger.remove()
 
-logger.add(
-    "app.log",
-    format=formatter,
-    level="INFO",
-    encoding="utf-8",
-    enqueue=True,
-    backtrace=True,
-    diagnose=True,
-    retention="3 days",
-)
+    logger.add(
+        sys.stdout,
+        format=formatter,
+        level="INFO",
+        colorize=True,
+        enqueue=True,
+        backtrace=True,
+        diagnose=True,
+    )
+
+    logger.add(
+        "app.log",
+        format=formatter,
+        level="INFO",
+        encoding="utf-8",
+        enqueue=True,
+        backtrace=True,
+        diagnose=True,
+        retention="3 days",
+    )
 
-logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
 
 
 HYDRA_CONFIG = {
@@ -133,6 +148,20 @@ def main() -> None:
         task = cfg.task
 
         match task:
+            case "sync":
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    runner.run(ship_upstream())
+            case "backfill":
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    runner.run(backfill_projection())
+            case "compress":
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    runner.run(compress_details())
+            case "bench_validators":
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    runner.run(bench_validators())
+            case "bench_sanitizer":
+                bench_sanitizer()
             case "greet":
                 user = UserClient()
                 with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
@@ -143,4 +172,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
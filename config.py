@@ -45,4 +45,30 @@ class Config:
     SMALL_SLEEP_SECONDS: float = 1.8
     LARGE_SLEEP_SECONDS: float = 7
     MAX_RETRIES_ALLOWED: int = 2
+    OFFLOAD_MIN_ITEMS: int = 20
+    JOB_WRITE_BATCH_SIZE: int = 50
+    JOB_WRITE_INTERVAL_SECONDS: float = 5
+    GREET_PAGE_SIZE: int = 40
+    LIST_REQUESTS_PER_RUN: int = 10
+    FRONTIER_LEASE_MINUTES: float = 30
+    QUERY_MIN_INTERVAL_HOURS: float = 6
+    QUERY_MAX_INTERVAL_HOURS: float = 7 * 24
     CITIES_PATH: Path = Path(__file__).parent / "database/city.json"
+    CITY_TREE_PATH: Path = Path(__file__).parent / "database/city_tree.json"
+    RESOLVED_FILTER_PATH: Path = (
+        Path("~").expanduser() / ".cache" / "zp_tool" / "resolved_jobs.bloom"
+    )
+    RESOLVED_FILTER_MAX_AGE_SECONDS: int = 24 * 3600
+    QUERY_STATS_PATH: Path = (
+        Path("~").expanduser() / ".cache" / "zp_tool" / "query_stats.json"
+    )
+    LOCAL_STORE_PATH: Path = Path(__file__).parent / "database/local.sqlite3"
+    LOCAL_DB_PATH: Path = Path(__file__).parent / "database/local_state.sqlite3"
+    SQLITE_SCHEMA_PATH: Path = Path(__file__).parent / "database/sqlite.sql"
+    MIGRATIONS_DIR: Path = Path(__file__).parent / "database/migrations"
+    DETAIL_DICT_SIZE: int = 112 * 1024
+    DETAIL_DICT_SAMPLES: int = 2000
+    MONGO_WRITE_ATTEMPTS: int = 4
+    MONGO_DEAD_LETTER_PATH: Path = (
+        Path("~").expanduser() / ".cache" / "zp_tool" / "mongo_dead_letter.jsonl"
+    )
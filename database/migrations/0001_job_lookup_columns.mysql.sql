@@ -0,0 +1,16 @@
+-- ----------------------------
+-- user_id/brand_id become plain columns filled at write time and the hot
+-- filters get composite indexes. TiDB cannot turn a VIRTUAL column into a
+-- STORED one in place; dropping and re-adding the columns avoids copying
+-- the table, and existing rows are filled in batches afterwards
+-- (DATA_MIGRATIONS in zp_tool/items.py).
+-- ----------------------------
+ALTER TABLE `job` DROP INDEX `idx_user_id`;
+ALTER TABLE `job` DROP INDEX `idx_brand_id`;
+ALTER TABLE `job` DROP COLUMN `user_id`;
+ALTER TABLE `job` DROP COLUMN `brand_id`;
+ALTER TABLE `job` ADD COLUMN `user_id` varchar(512) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `brand_id` varchar(512) DEFAULT NULL;
+CREATE INDEX `idx_contacted_user_id` ON `job` (`contacted`, `user_id`);
+CREATE INDEX `idx_contacted_brand_id` ON `job` (`contacted`, `brand_id`);
+CREATE INDEX `idx_contacted_acceptable` ON `job` (`contacted`, `acceptable`);
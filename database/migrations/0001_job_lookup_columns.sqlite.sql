@@ -0,0 +1,16 @@
+-- ----------------------------
+-- user_id/brand_id become plain columns filled at write time and the hot
+-- filters get composite indexes. Existing rows are filled in batches
+-- afterwards (DATA_MIGRATIONS in zp_tool/items.py). Secondary indexes carry
+-- the rowid rather than the id, so id is appended to the contactable index
+-- to keep that lookup index-only.
+-- ----------------------------
+DROP INDEX IF EXISTS `idx_user_id`;
+DROP INDEX IF EXISTS `idx_brand_id`;
+ALTER TABLE `job` DROP COLUMN `user_id`;
+ALTER TABLE `job` DROP COLUMN `brand_id`;
+ALTER TABLE `job` ADD COLUMN `user_id` varchar(512) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `brand_id` varchar(512) DEFAULT NULL;
+CREATE INDEX IF NOT EXISTS `idx_contacted_user_id` ON `job` (`contacted`, `user_id`);
+CREATE INDEX IF NOT EXISTS `idx_contacted_brand_id` ON `job` (`contacted`, `brand_id`);
+CREATE INDEX IF NOT EXISTS `idx_contacted_acceptable` ON `job` (`contacted`, `acceptable`, `id`);
@@ -0,0 +1,12 @@
+-- ----------------------------
+-- Hot fields projected out of detail at write time, so acceptability and
+-- greeting never parse the whole document. Existing rows are filled in
+-- batches right after these statements (DATA_MIGRATIONS in zp_tool/items.py).
+-- ----------------------------
+ALTER TABLE `job` ADD COLUMN `scale` smallint DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `large_company` tinyint(1) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `brand_name` varchar(512) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `boss_name` varchar(512) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `city` varchar(128) DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `salary_min` smallint DEFAULT NULL;
+ALTER TABLE `job` ADD COLUMN `salary_max` smallint DEFAULT NULL;
@@ -0,0 +1,14 @@
+-- ----------------------------
+-- Optional zstd-compressed detail (detail_zstd). A compressed row has a
+-- NULL detail; user_id/brand_id and the projection are plain columns
+-- since 0001/0002, so only the new column and the dictionary table are
+-- added here.
+-- ----------------------------
+ALTER TABLE `job` ADD COLUMN `detail_zstd` mediumblob DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS `zstd_dict` (
+  `id` bigint NOT NULL,
+  `data` mediumblob NOT NULL,
+  `created_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`) /*T![clustered_index] CLUSTERED */
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
@@ -0,0 +1,13 @@
+-- ----------------------------
+-- Optional zstd-compressed detail (detail_zstd). A compressed row has a
+-- NULL detail; user_id/brand_id and the projection are plain columns
+-- since 0001/0002, so only the new column and the dictionary table are
+-- added here.
+-- ----------------------------
+ALTER TABLE `job` ADD COLUMN `detail_zstd` blob DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS `zstd_dict` (
+  `id` bigint NOT NULL PRIMARY KEY,
+  `data` blob NOT NULL,
+  `created_at` datetime DEFAULT NULL
+);
@@ -0,0 +1,4 @@
+-- ----------------------------
+-- Lets the greet stream page through contactable jobs newest first.
+-- ----------------------------
+CREATE INDEX IF NOT EXISTS `idx_contactable_inspected` ON `job` (`contacted`, `acceptable`, `last_inspection_time`, `id`);
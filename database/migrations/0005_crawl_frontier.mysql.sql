@@ -0,0 +1,11 @@
+-- ----------------------------
+-- Cursor and lease per (parameter grid, shard) for the list crawl.
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `crawl_frontier` (
+  `id` varchar(255) NOT NULL,
+  `position` bigint NOT NULL DEFAULT 0,
+  `done_ahead` json DEFAULT NULL,
+  `owner` varchar(255) DEFAULT NULL,
+  `lease_until` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`) /*T![clustered_index] CLUSTERED */
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
@@ -0,0 +1,10 @@
+-- ----------------------------
+-- Cursor and lease per (parameter grid, shard) for the list crawl.
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `crawl_frontier` (
+  `id` varchar(255) NOT NULL PRIMARY KEY,
+  `position` bigint NOT NULL DEFAULT 0,
+  `done_ahead` json DEFAULT NULL,
+  `owner` varchar(255) DEFAULT NULL,
+  `lease_until` datetime DEFAULT NULL
+);
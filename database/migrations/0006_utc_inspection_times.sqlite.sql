@@ -0,0 +1,5 @@
+-- ----------------------------
+-- last_inspection_time was written as local time and is now written as
+-- UTC. No schema change: existing rows are converted in batches right
+-- after this script (DATA_MIGRATIONS in zp_tool/items.py).
+-- ----------------------------
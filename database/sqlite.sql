@@ -0,0 +1,31 @@
+-- ----------------------------
+-- SQLite schema for single-node runs (see tidb.sql)
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `job` (
+  `id` varchar(512) NOT NULL PRIMARY KEY,
+  `acceptable` tinyint(1) DEFAULT NULL,
+  `contacted` tinyint(1) DEFAULT NULL,
+  `last_inspection_time` datetime DEFAULT NULL,
+  `detail` json DEFAULT NULL,
+  `user_id` varchar(512) GENERATED ALWAYS AS (json_extract(`detail`, '$.jobInfo.encryptUserId')) VIRTUAL,
+  `brand_id` varchar(512) GENERATED ALWAYS AS (json_extract(`detail`, '$.brandComInfo.encryptBrandId')) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS `idx_user_id` ON `job` (`user_id`);
+CREATE INDEX IF NOT EXISTS `idx_brand_id` ON `job` (`brand_id`);
+
+CREATE TABLE IF NOT EXISTS `mask_company` (
+  `com_id` bigint NOT NULL PRIMARY KEY,
+  `encrypt_id` varchar(512) DEFAULT NULL,
+  `com_name` varchar(512) DEFAULT NULL,
+  `link_com_num` tinyint DEFAULT 0,
+  `encrypt_com_id` varchar(512) DEFAULT NULL
+);
+
+CREATE TABLE IF NOT EXISTS `user_black` (
+  `user_id` bigint NOT NULL PRIMARY KEY,
+  `name` varchar(512) DEFAULT NULL,
+  `avatar` varchar(512) DEFAULT NULL,
+  `security_id` varchar(512) DEFAULT NULL,
+  `info` varchar(512) DEFAULT NULL,
+  `user_source` tinyint(1) DEFAULT 0
+);
@@ -35,11 +35,41 @@ def clean(_c, storage=False) -> None:
 
 
 @task(default=True)
-def run(c) -> None:
+def run(c, shard="") -> None:
     _clean()
-    _run(c)
+    _run(c, [f"++shard={shard}"] if shard else None)
 
 @task
 def greet(c) -> None:
     _clean()
     _run(c, ["++task=greet"])
+
+
+@task
+def sync(c) -> None:
+    _clean()
+    _run(c, ["++task=sync"])
+
+
+@task
+def backfill(c) -> None:
+    _clean()
+    _run(c, ["++task=backfill"])
+
+
+@task
+def compress(c) -> None:
+    _clean()
+    _run(c, ["++task=compress"])
+
+
+@task
+def bench_validators(c) -> None:
+    _clean()
+    _run(c, ["++task=bench_validators"])
+
+
+@task
+def bench_sanitizer(c) -> None:
+    _clean()
+    _run(c, ["++task=bench_sanitizer"])
@@ -0,0 +1,170 @@
+import math
+import os
+import struct
+import time
+from hashlib import blake2b
+from pathlib import Path
+
+from loguru import logger
+
+_HEADER = struct.Struct("<4sQQQQ")
+_MAGIC = b"ZPBF"
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.built_at = int(time.time())
+        self.bits = bytearray((self.size + 7) // 8)
+        self.lookups = 0
+        self.db_checks = 0
+        self.false_hits = 0
+
+    def _positions(self, key: str) -> list[int]:
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        self.lookups += 1
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def record_db_check(self, checked: int, confirmed: int) -> None:
+        self.db_checks += checked
+        self.false_hits += checked - confirmed
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "entries": self.count,
+            "memory_bytes": self.memory_bytes,
+            "estimated_error_rate": self.estimated_error_rate,
+            "lookups": self.lookups,
+            "db_checks": self.db_checks,
+            "false_hits": self.false_hits,
+            "observed_error_rate": (
+                self.false_hits / self.lookups if self.lookups else 0.0
+            ),
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            f.write(
+                _HEADER.pack(
+                    _MAGIC,
+                    self.size,
+                    self.hashes,
+                    self.count,
+                    self.built_at,
+                ),
+            )
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BloomFilter | None":
+        try:
+            with path.open("rb") as f:
+                header = _HEADER.unpack(f.read(_HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        magic, size, hashes, count, built_at = header
+        if magic != _MAGIC or len(bits) != (size + 7) // 8:
+            return None
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.count = size, hashes, count
+        bloom.built_at, bloom.bits = built_at, bits
+        bloom.lookups = bloom.db_checks = bloom.false_hits = 0
+        return bloom
+
+
+_RESOLVED_FILTER: BloomFilter | None = None
+_RESOLVED_JOURNAL = None
+
+
+def _journal_path(path: Path) -> Path:
+    return path.with_suffix(".journal")
+
+
+def get_resolved_filter() -> BloomFilter | None:
+    return _RESOLVED_FILTER
+
+
+def set_resolved_filter(bloom: BloomFilter | None, path: Path) -> None:
+    global _RESOLVED_FILTER, _RESOLVED_JOURNAL
+    if _RESOLVED_JOURNAL is not None:
+        _RESOLVED_JOURNAL.close()
+        _RESOLVED_JOURNAL = None
+    _RESOLVED_FILTER = bloom
+    if bloom is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _RESOLVED_JOURNAL = _journal_path(path).open(
+            "a",
+            encoding="utf-8",
+            buffering=1,
+        )
+
+
+def add_resolved(job_id: str) -> None:
+    # Every addition is journaled so that an unsaved filter (crash, sys.exit)
+    # never forgets a resolved job and lets it be fetched and reset again.
+    if _RESOLVED_FILTER is None:
+        return
+    _RESOLVED_FILTER.add(job_id)
+    if _RESOLVED_JOURNAL is not None:
+        _RESOLVED_JOURNAL.write(job_id + "\n")
+
+
+def load_resolved_filter(path: Path, max_age_seconds: float) -> BloomFilter | None:
+    # The database stays the source of truth: jobs resolved by other nodes
+    # only reach the filter when it is rebuilt, so it expires after a while.
+    bloom = BloomFilter.load(path)
+    if bloom is None:
+        return None
+    age = time.time() - bloom.built_at
+    if age > max_age_seconds:
+        logger.info(f"Resolved-job filter is {age / 3600:.1f}h old, rebuilding")
+        return None
+    journal = _journal_path(path)
+    if journal.exists():
+        with journal.open(encoding="utf-8") as f:
+            for line in f:
+                if line := line.strip():
+                    bloom.add(line)
+    return bloom
+
+
+def save_resolved_filter(path: Path) -> None:
+    if _RESOLVED_FILTER is None:
+        return
+    _RESOLVED_FILTER.save(path)
+    if _RESOLVED_JOURNAL is not None:
+        _RESOLVED_JOURNAL.truncate(0)
+    else:
+        _journal_path(path).unlink(missing_ok=True)
+    logger.info(f"Resolved-job filter: {_RESOLVED_FILTER.stats()}")
@@ -0,0 +1,80 @@
+from typing import Any
+
+import orjson
+from loguru import logger
+
+
+class DetailCodec:
+    # zstd frames record the id of the dictionary they were compressed with,
+    # so rows written before a retrain still decompress after it.
+    def __init__(self, level: int = 10) -> None:
+        import zstandard
+
+        self._zstd = zstandard
+        self.level = level
+        self.dict_id = 0
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._dicts: dict[int, Any] = {}
+        self._decompressors: dict[int, Any] = {0: zstandard.ZstdDecompressor()}
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def add_dictionary(self, data: bytes, *, active: bool = True) -> int:
+        zdict = self._zstd.ZstdCompressionDict(data)
+        dict_id = zdict.dict_id()
+        self._dicts[dict_id] = zdict
+        self._decompressors[dict_id] = self._zstd.ZstdDecompressor(dict_data=zdict)
+        if active:
+            self.dict_id = dict_id
+            self._compressor = self._zstd.ZstdCompressor(
+                level=self.level,
+                dict_data=zdict,
+            )
+        return dict_id
+
+    def train(self, samples: list[bytes], dict_size: int) -> bytes | None:
+        try:
+            zdict = self._zstd.train_dictionary(dict_size, samples)
+        except self._zstd.ZstdError as e:
+            logger.warning(f"zstd dictionary training failed: {e}")
+            return None
+        return zdict.as_bytes()
+
+    def compress(self, detail: Any) -> bytes:
+        raw = orjson.dumps(detail)
+        data = self._compressor.compress(raw)
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(data)
+        return data
+
+    def decompress(self, data: bytes) -> Any:
+        dict_id = self._zstd.get_frame_parameters(data).dict_id
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            msg = f"Unknown zstd dictionary: {dict_id}"
+            raise ValueError(msg)
+        return orjson.loads(decompressor.decompress(data))
+
+    @property
+    def ratio(self) -> float:
+        if not self.compressed_bytes:
+            return 0.0
+        return self.raw_bytes / self.compressed_bytes
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "dict_id": self.dict_id,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": round(self.ratio, 2),
+        }
+
+
+_CODEC: DetailCodec | None = None
+
+
+def get_detail_codec() -> DetailCodec:
+    global _CODEC
+    if _CODEC is None:
+        _CODEC = DetailCodec()
+    return _CODEC
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import math
+import os
+import socket
+from collections.abc import Callable, Sequence
+from datetime import timedelta
+from typing import Any
+
+import orjson
+from loguru import logger
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+
+from .items import CrawlCursor
+
+
+class ParamSpace:
+    # Cartesian product addressed by index in mixed radix, last axis fastest
+    # like itertools.product, so the grid is never materialized.
+    def __init__(self, *axes: Sequence[Any]) -> None:
+        self.axes = [list(axis) for axis in axes]
+        self.size = math.prod(len(axis) for axis in self.axes)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> tuple[Any, ...]:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        values: list[Any] = []
+        for axis in reversed(self.axes):
+            index, digit = divmod(index, len(axis))
+            values.append(axis[digit])
+        return tuple(reversed(values))
+
+    def fingerprint(self) -> str:
+        # A changed config is a different grid, with its own cursor.
+        return hashlib.blake2b(orjson.dumps(self.axes), digest_size=8).hexdigest()
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    if not spec:
+        return 0, 1
+    index, _, count = spec.partition("/")
+    shard = int(index), int(count or 1)
+    if not 0 <= shard[0] < shard[1]:
+        msg = f"Invalid shard {spec!r}, expected i/N with 0 <= i < N"
+        raise ValueError(msg)
+    return shard
+
+
+class CrawlFrontier:
+    # Shard i of N owns grid indexes i, i+N, i+2N, ... and walks them in
+    # order. The cursor is an ever-growing position (pass = position // size)
+    # that only moves past a combination once its list page is done, so an
+    # interrupted run resumes at the first unfinished one. Positions done
+    # out of order are kept in done_ahead until the cursor reaches them.
+    # The row lives in the job database, so on MySQL it is shared between
+    # machines and its lease keeps two workers off the same shard. A
+    # heartbeat renews the lease while the shard is held; once it is lost
+    # the shard is given up for the rest of the run.
+    def __init__(
+        self,
+        space: ParamSpace,
+        shard: tuple[int, int],
+        lease: timedelta,
+    ) -> None:
+        self.space = space
+        self.shard_index, self.shard_count = shard
+        self.size = len(range(self.shard_index, len(space), self.shard_count))
+        self.lease = lease
+        self.key = f"{space.fingerprint()}:{self.shard_index}/{self.shard_count}"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.position = 0
+        self.done_ahead: set[int] = set()
+        self.acquired = False
+        self.lost = False
+        self._heartbeat: asyncio.Task | None = None
+
+    def params(self, position: int) -> tuple[Any, ...]:
+        return self.space[self.shard_index + position % self.size * self.shard_count]
+
+    async def acquire(self) -> bool:
+        if not self.size or self.lost:
+            return False
+        if not await CrawlCursor.exists(id=self.key):
+            try:
+                await CrawlCursor.create(id=self.key)
+            except IntegrityError:
+                # Another worker starting at the same time created it first.
+                pass
+        now = timezone.now()
+        updated = await CrawlCursor.filter(
+            Q(id=self.key)
+            & (
+                Q(owner__isnull=True)
+                | Q(owner=self.owner)
+                | Q(lease_until__lt=now)
+            ),
+        ).update(owner=self.owner, lease_until=now + self.lease)
+        if not updated:
+            logger.warning(f"Shard {self.key} is leased by another worker")
+            return False
+        cursor = await CrawlCursor.get(id=self.key)
+        self.position = cursor.position
+        self.done_ahead = set(cursor.done_ahead or [])
+        self.acquired = True
+        self._heartbeat = asyncio.create_task(self._keep_lease())
+        logger.info(
+            f"Frontier {self.key}: {self.size} combinations, "
+            f"pass {self.position // self.size}, "
+            f"at {self.position % self.size}",
+        )
+        return True
+
+    async def _keep_lease(self) -> None:
+        # List pages can queue up behind detail requests for longer than the
+        # lease, so it is renewed on a timer rather than as pages finish.
+        while self.acquired:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                renewed = await CrawlCursor.filter(
+                    id=self.key,
+                    owner=self.owner,
+                ).update(lease_until=timezone.now() + self.lease)
+            except Exception as e:
+                logger.warning(
+                    f"Lease renewal on shard {self.key} failed: "
+                    f"{type(e).__name__}: {e}",
+                )
+                continue
+            if not renewed and self.acquired:
+                self._lose_lease()
+
+    def _lose_lease(self) -> None:
+        logger.warning(f"Lost the lease on shard {self.key}, giving it up")
+        self.acquired = False
+        self.lost = True
+
+    def take(
+        self,
+        limit: int,
+        accept: Callable[[tuple[Any, ...]], bool],
+    ) -> list[tuple[int, tuple[Any, ...]]]:
+        # Combinations turned down by accept count as done right away; the
+        # taken ones stay pending until complete() is called for them.
+        taken: list[tuple[int, tuple[Any, ...]]] = []
+        for position in range(self.position, self.position + self.size):
+            if len(taken) >= limit:
+                break
+            if position in self.done_ahead:
+                continue
+            params = self.params(position)
+            if accept(params):
+                taken.append((position, params))
+            else:
+                self._mark_done(position)
+        return taken
+
+    def _mark_done(self, position: int) -> None:
+        if position >= self.position:
+            self.done_ahead.add(position)
+        while self.position in self.done_ahead:
+            self.done_ahead.discard(self.position)
+            self.position += 1
+
+    async def complete(self, position: int) -> None:
+        self._mark_done(position)
+        await self.save()
+
+    async def save(self, *, release: bool = False) -> None:
+        if release and self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if not self.acquired:
+            return
+        updated = await CrawlCursor.filter(id=self.key, owner=self.owner).update(
+            position=self.position,
+            done_ahead=sorted(self.done_ahead),
+            owner=None if release else self.owner,
+            lease_until=None if release else timezone.now() + self.lease,
+        )
+        if not updated:
+            self._lose_lease()
+        elif release:
+            self.acquired = False
@@ -1,13 +1,36 @@
+import asyncio
 import os
+import re
 import ssl
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import datetime
+from functools import partial
+from pathlib import Path
 from typing import Any
 
 import orjson
 import psutil
-from tortoise import Tortoise, fields
+from loguru import logger
+from tenacity import retry, stop_after_attempt, wait_exponential
+from tortoise import Tortoise, fields, timezone
 from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import OperationalError
 from tortoise.expressions import Q
 from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from config import Config
+
+from .bloom import (
+    BloomFilter,
+    add_resolved,
+    get_resolved_filter,
+    load_resolved_filter,
+    save_resolved_filter,
+    set_resolved_filter,
+)
+from .compression import get_detail_codec
 
 
 def _calculate_db_pool_config() -> tuple[int, int, int, int]:
@@ -28,26 +51,56 @@ def _calculate_db_pool_config() -> tuple[int, int, int, int]:
     return minsize, maxsize, pool_recycle, connect_timeout
 
 
-async def init_db() -> None:
+def _use_local_db() -> bool:
+    # The local SQLite file is opt-in, so a deployment that lost MYSQL_URL
+    # fails at start instead of writing to a throwaway database.
+    if os.environ.get("LOCAL_DB", "").lower() in {"1", "true", "yes"}:
+        return True
+    if Config.cfg is not None and Config.cfg.get("storage") == "local":
+        return True
+    if not os.environ.get("MYSQL_URL"):
+        msg = "MYSQL_URL is not set; set LOCAL_DB=1 or storage=local for SQLite"
+        raise ValueError(msg)
+    return False
+
+
+def _local_connection() -> dict[str, Any]:
+    Config.LOCAL_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    return {
+        "engine": "tortoise.backends.sqlite",
+        "credentials": {
+            "file_path": str(Config.LOCAL_DB_PATH),
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+        },
+    }
+
+
+def _mysql_connection() -> dict[str, Any]:
     ctx = ssl.create_default_context()
     conn_base = expand_db_url(os.environ["MYSQL_URL"])
 
     minsize, maxsize, pool_recycle, connect_timeout = _calculate_db_pool_config()
 
+    return {
+        "engine": conn_base["engine"],
+        "credentials": {
+            **conn_base["credentials"],
+            "ssl": ctx,
+            "minsize": minsize,
+            "maxsize": maxsize,
+            "pool_recycle": pool_recycle,
+            "connect_timeout": connect_timeout,
+            "echo": False,
+        },
+    }
+
+
+async def init_db() -> None:
+    local = _use_local_db()
     db_config = {
         "connections": {
-            "default": {
-                "engine": conn_base["engine"],
-                "credentials": {
-                    **conn_base["credentials"],
-                    "ssl": ctx,
-                    "minsize": minsize,
-                    "maxsize": maxsize,
-                    "pool_recycle": pool_recycle,
-                    "connect_timeout": connect_timeout,
-                    "echo": False,
-                },
-            },
+            "default": _local_connection() if local else _mysql_connection(),
         },
         "apps": {
             "models": {
@@ -57,13 +110,195 @@ async def init_db() -> None:
         },
     }
     await Tortoise.init(config=db_config)
-    await Tortoise.generate_schemas(safe=True)
+    await migrate()
+    await load_detail_dictionaries()
+
+
+def get_dialect() -> str:
+    return Tortoise.get_connection("default").capabilities.dialect
+
+
+def _migrations(dialect: str) -> list[tuple[int, Path]]:
+    suffix = ".sqlite.sql" if dialect == "sqlite" else ".mysql.sql"
+    return sorted(
+        (int(path.name.split("_", 1)[0]), path)
+        for path in Config.MIGRATIONS_DIR.glob(f"*{suffix}")
+    )
+
+
+def _statements(script: str) -> list[str]:
+    lines = [line for line in script.splitlines() if not line.startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def get_schema_version() -> int:
+    conn = Tortoise.get_connection("default")
+    await conn.execute_script(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL)",
+    )
+    await conn.execute_script(
+        "CREATE TABLE IF NOT EXISTS schema_progress ("
+        "version INT NOT NULL PRIMARY KEY, "
+        "step INT NOT NULL, "
+        "resume_after VARCHAR(512) NOT NULL)",
+    )
+    rows = await conn.execute_query_dict(
+        "SELECT MAX(version) AS version FROM schema_version",
+    )
+    return rows[0]["version"] or 0
+
+
+async def _get_progress(version: int) -> tuple[int, str]:
+    conn = Tortoise.get_connection("default")
+    rows = await conn.execute_query_dict(
+        f"SELECT step, resume_after FROM schema_progress WHERE version = {version}",
+    )
+    if rows:
+        return rows[0]["step"], rows[0]["resume_after"]
+    await conn.execute_query(
+        f"INSERT INTO schema_progress (version, step, resume_after) "
+        f"VALUES ({version}, 0, '')",
+    )
+    return 0, ""
+
+
+async def _save_progress(
+    conn: Any,
+    version: int,
+    step: int,
+    resume_after: str = "",
+) -> None:
+    placeholder = "?" if get_dialect() == "sqlite" else "%s"
+    await conn.execute_query(
+        f"UPDATE schema_progress SET step = {step}, resume_after = {placeholder} "
+        f"WHERE version = {version}",
+        [resume_after],
+    )
+
+
+# MySQL/TiDB errors meaning a DDL statement already took effect: table
+# exists, duplicate column, duplicate key name, nothing to drop.
+_ALREADY_APPLIED = {1050, 1060, 1061, 1091}
+
+
+def _mysql_error_code(e: OperationalError) -> int | None:
+    # tortoise wraps the driver error, whose first argument is the code.
+    cause = e.args[0] if e.args else None
+    if isinstance(cause, Exception) and cause.args and isinstance(cause.args[0], int):
+        return cause.args[0]
+    return None
+
+
+async def _run_step(version: int, step: int, statement: str) -> None:
+    # SQLite DDL is transactional, so a statement and its progress row
+    # commit together. MySQL/TiDB commit DDL implicitly, so a statement cut
+    # off before its progress row was written runs again on resume; the
+    # error saying it already took effect counts as done. The scripts stay
+    # in plain MySQL 8 syntax, without TiDB's IF [NOT] EXISTS forms.
+    if get_dialect() == "sqlite":
+        async with in_transaction("default") as conn:
+            await conn.execute_query(statement)
+            await _save_progress(conn, version, step)
+        return
+    conn = Tortoise.get_connection("default")
+    try:
+        await conn.execute_query(statement)
+    except OperationalError as e:
+        if _mysql_error_code(e) not in _ALREADY_APPLIED:
+            raise
+        logger.info(f"Migration {version} step {step} already applied: {e}")
+    await _save_progress(conn, version, step)
+
+
+async def migrate() -> None:
+    version = await get_schema_version()
+    dialect = get_dialect()
+    pending = [(v, path) for v, path in _migrations(dialect) if v > version]
+    if not pending:
+        return
+    if version == 0:
+        # Version 0 is the baseline schema (tidb.sql / sqlite.sql).
+        # generate_schemas cannot express the user_id/brand_id generated
+        # columns, so the SQLite tables come from database/sqlite.sql.
+        if dialect == "sqlite":
+            conn = Tortoise.get_connection("default")
+            await conn.execute_script(Config.SQLITE_SCHEMA_PATH.read_text())
+        await Tortoise.generate_schemas(safe=True)
+    conn = Tortoise.get_connection("default")
+    for target, path in pending:
+        # Each statement, and each batch of a data step, is recorded in
+        # schema_progress, so an interrupted migration resumes where it
+        # stopped instead of starting over on a half-changed schema.
+        step, resume_after = await _get_progress(target)
+        statements = _statements(path.read_text())
+        logger.info(
+            f"Migrating schema {version} -> {target}: {path.name}"
+            + (f" (resuming at step {step})" if step else ""),
+        )
+        for i in range(step, len(statements)):
+            await _run_step(target, i + 1, statements[i])
+        if data_step := DATA_MIGRATIONS.get(target):
+            await data_step(target, len(statements), resume_after)
+        await conn.execute_query(
+            f"INSERT INTO schema_version (version) VALUES ({target})",
+        )
+        await conn.execute_query(
+            f"DELETE FROM schema_progress WHERE version = {target}",
+        )
+        version = target
 
 
 async def close_db() -> None:
     await Tortoise.close_connections()
 
 
+def compress_detail_enabled() -> bool:
+    return Config.cfg is not None and bool(Config.cfg.get("compress_detail"))
+
+
+class CompressedJSONField(fields.BinaryField):
+    # A JSON document stored as a zstd frame, (de)compressed on the way
+    # to and from the database.
+    def to_db_value(self, value: Any, instance: Any) -> bytes | None:
+        if value is None or isinstance(value, bytes):
+            return value
+        return get_detail_codec().compress(value)
+
+    def to_python_value(self, value: Any) -> Any:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return get_detail_codec().decompress(bytes(value))
+        return value
+
+
+class ZstdDict(Model):
+    id: int = fields.BigIntField(primary_key=True)
+    data: bytes = fields.BinaryField()
+    created_at: Any = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "zstd_dict"
+
+
+class CrawlCursor(Model):
+    id: str = fields.CharField(primary_key=True, max_length=255)
+    position: int = fields.BigIntField(default=0)
+    done_ahead: Any = fields.JSONField(null=True)
+    owner: str | None = fields.CharField(max_length=255, null=True)
+    lease_until: Any = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "crawl_frontier"
+
+
+async def load_detail_dictionaries() -> None:
+    dictionaries = await ZstdDict.all().order_by("created_at", "id")
+    if not dictionaries and not compress_detail_enabled():
+        return
+    codec = get_detail_codec()
+    for zdict in dictionaries:
+        codec.add_dictionary(zdict.data)
+
+
 class MaskCompany(Model):
     com_id: int = fields.BigIntField(primary_key=True)
     encrypt_id: str | None = fields.CharField(max_length=512, null=True)
@@ -87,79 +322,700 @@ class UserBlack(Model):
         table = "user_black"
 
 
+class BlocklistIndex:
+    # Masked brands are matched with com_name LIKE %brand%, so the names are
+    # kept in one NUL-joined corpus and checked with a substring search.
+    # Matching is case-sensitive, as LIKE is under the utf8mb4_bin tables;
+    # SQLite's LIKE ignores ASCII case, so the database fallbacks use it
+    # only to narrow the rows and recheck them here.
+    REFRESH_SECONDS = 600
+
+    def __init__(self) -> None:
+        self._mask_names: dict[int, str] = {}
+        self._mask_corpus = ""
+        self._black_infos: dict[str, dict[int, str]] = {}
+        self._black_corpus: dict[str, str] = {}
+        self._dirty = False
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> None:
+        masks = await MaskCompany.filter(com_name__isnull=False).values_list(
+            "com_id",
+            "com_name",
+        )
+        blacks = await UserBlack.filter(
+            info__isnull=False,
+            name__isnull=False,
+        ).values_list("user_id", "name", "info")
+        self._mask_names = dict(masks)
+        self._black_infos = {}
+        for user_id, name, info in blacks:
+            self._black_infos.setdefault(name, {})[user_id] = info
+        self._rebuild()
+        self._loaded_at = time.monotonic()
+        logger.info(
+            f"Blocklist index loaded: {len(self._mask_names)} masked companies, "
+            f"{len(blacks)} blacklisted users",
+        )
+
+    def _rebuild(self) -> None:
+        self._mask_corpus = "\0".join(self._mask_names.values())
+        self._black_corpus = {
+            name: "\0".join(infos.values())
+            for name, infos in self._black_infos.items()
+        }
+        self._dirty = False
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self.REFRESH_SECONDS
+        )
+
+    async def _ensure_loaded(self) -> bool:
+        if not self._is_fresh():
+            async with self._lock:
+                if not self._is_fresh():
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        logger.warning(f"Blocklist index refresh failed: {e}")
+                        if self._loaded_at is None:
+                            return False
+                        self._loaded_at = time.monotonic()
+        if self._dirty:
+            self._rebuild()
+        return True
+
+    def add_mask_company(self, com_id: int, com_name: str | None) -> None:
+        if com_name is None:
+            self._mask_names.pop(com_id, None)
+        else:
+            self._mask_names[com_id] = com_name
+        self._dirty = True
+
+    async def is_masked(self, brand_name: str) -> bool:
+        if await self._ensure_loaded():
+            return brand_name in self._mask_corpus
+        names = (
+            await MaskCompany
+            .filter(com_name__isnull=False, com_name__contains=brand_name)
+            .values_list("com_name", flat=True)
+        )
+        return any(brand_name in name for name in names)
+
+    async def is_blacklisted(self, boss_name: str, brand_name: str) -> bool:
+        if await self._ensure_loaded():
+            return brand_name in self._black_corpus.get(boss_name, "")
+        infos = (
+            await UserBlack
+            .filter(
+                info__isnull=False,
+                name__isnull=False,
+                info__contains=brand_name,
+                name=boss_name,
+            )
+            .values_list("info", flat=True)
+        )
+        return any(brand_name in info for info in infos)
+
+    async def is_blocked(self, brand_name: str | None, boss_name: str | None) -> bool:
+        if not brand_name:
+            return False
+        if await self.is_masked(brand_name):
+            return True
+        return bool(boss_name and await self.is_blacklisted(boss_name, brand_name))
+
+
+blocklist_index = BlocklistIndex()
+
+PROJECTION_FIELDS = (
+    "user_id",
+    "brand_id",
+    "scale",
+    "large_company",
+    "brand_name",
+    "boss_name",
+    "city",
+    "salary_min",
+    "salary_max",
+)
+# Everything is_acceptable / evaluate_acceptability read; load jobs for
+# them with .only(*ACCEPTABILITY_FIELDS).
+ACCEPTABILITY_FIELDS = ("id", *PROJECTION_FIELDS)
+# The original acceptability rule: any mention of "1000人" in the detail
+# marks a large company. Kept as the exact substring match.
+LARGE_COMPANY_MARKER = "1000人"
+
+_LEADING_NUMBER = re.compile(r"\d+")
+_SALARY_RANGE = re.compile(r"(\d+)-(\d+)K")
+
+
+def decode_detail(detail: Any) -> Any:
+    # Some rows were stored double-encoded, i.e. as a JSON string of JSON.
+    while isinstance(detail, (str, bytes)):
+        detail = orjson.loads(detail)
+    return detail
+
+
+def project_detail(data: dict[str, Any]) -> tuple[Any, ...]:
+    job_info = data.get("jobInfo") or {}
+    brand = data.get("brandComInfo") or {}
+    scale = _LEADING_NUMBER.search(brand.get("scaleName") or "")
+    salary = _SALARY_RANGE.search(job_info.get("salaryDesc") or "")
+    return (
+        job_info.get("encryptUserId"),
+        brand.get("encryptBrandId"),
+        int(scale.group()) if scale else None,
+        LARGE_COMPANY_MARKER in str(data),
+        brand.get("brandName"),
+        (data.get("bossInfo") or {}).get("name"),
+        job_info.get("locationName"),
+        int(salary.group(1)) if salary else None,
+        int(salary.group(2)) if salary else None,
+    )
+
+
 class Job(Model):
     id: str = fields.CharField(primary_key=True, max_length=512)
     acceptable: bool | None = fields.BooleanField(null=True)
     contacted: bool | None = fields.BooleanField(null=True)
     last_inspection_time: Any = fields.DatetimeField(null=True)
     detail: Any = fields.JSONField(null=True)
-    user_id: str | None = fields.CharField(max_length=512, null=True, generated=True)
-    brand_id: str | None = fields.CharField(max_length=512, null=True, generated=True)
+    detail_zstd: Any = CompressedJSONField(null=True)
+    user_id: str | None = fields.CharField(max_length=512, null=True)
+    brand_id: str | None = fields.CharField(max_length=512, null=True)
+    scale: int | None = fields.SmallIntField(null=True)
+    large_company: bool | None = fields.BooleanField(null=True)
+    brand_name: str | None = fields.CharField(max_length=512, null=True)
+    boss_name: str | None = fields.CharField(max_length=512, null=True)
+    city: str | None = fields.CharField(max_length=128, null=True)
+    salary_min: int | None = fields.SmallIntField(null=True)
+    salary_max: int | None = fields.SmallIntField(null=True)
 
     class Meta:
         table = "job"
 
+    async def save(self, *args: Any, **kwargs: Any) -> None:
+        if self.detail is not None:
+            self.detail = decode_detail(self.detail)
+            self.set_projection(self.detail)
+            if compress_detail_enabled():
+                self.detail, self.detail_zstd = None, self.detail
+        await super().save(*args, **kwargs)
+        if self.contacted or self.acceptable is False:
+            add_resolved(self.id)
+
     @classmethod
-    async def get_contactable_ids(cls) -> list[str]:
-        return (
-            await cls
-            .filter(contacted=False, acceptable=True)
-            .limit(40)
-            .values_list("id", flat=True)
+    async def init_resolved_filter(cls) -> BloomFilter:
+        bloom = load_resolved_filter(
+            Config.RESOLVED_FILTER_PATH,
+            Config.RESOLVED_FILTER_MAX_AGE_SECONDS,
         )
+        if bloom is None or bloom.estimated_error_rate > 0.01:
+            ids = await cls.filter(
+                Q(contacted=True) | Q(acceptable=False),
+            ).values_list("id", flat=True)
+            bloom = BloomFilter(capacity=max(100_000, len(ids) * 2))
+            for job_id in ids:
+                bloom.add(job_id)
+            set_resolved_filter(bloom, Config.RESOLVED_FILTER_PATH)
+            save_resolved_filter(Config.RESOLVED_FILTER_PATH)
+        else:
+            set_resolved_filter(bloom, Config.RESOLVED_FILTER_PATH)
+        return bloom
 
-    async def is_acceptable(self) -> bool:
-        result = True
-        if not self.detail:
-            return result
-        data = self.detail
-        while isinstance(data, str):
-            data = orjson.loads(data)
-
-        brand_name = data.get("brandComInfo", {}).get("brandName")
-        if brand_name:
-            result &= (
-                not await MaskCompany
-                .filter(com_name__isnull=False, com_name__contains=brand_name)
-                .limit(1)
-                .exists()
+    @classmethod
+    def save_resolved_filter(cls) -> None:
+        save_resolved_filter(Config.RESOLVED_FILTER_PATH)
+
+    @classmethod
+    async def _contactable_page(
+        cls,
+        order_by: str,
+        page_size: int,
+        after: tuple[bool, Any, str | None] | None,
+    ) -> list[tuple[bool, Any, str]]:
+        # Keyset on (order field, id). Rows whose order field is NULL come
+        # last, in a second pass ordered by id alone.
+        field = order_by.lstrip("-")
+        op = "lt" if order_by.startswith("-") else "gt"
+        id_order = "-id" if op == "lt" else "id"
+        query = cls.filter(contacted=False, acceptable=True)
+        nulls = field == "id" or (after is not None and after[0])
+        if nulls:
+            if field != "id":
+                query = query.filter(**{f"{field}__isnull": True})
+            if after is not None and after[2] is not None:
+                query = query.filter(**{f"id__{op}": after[2]})
+            rows = await query.order_by(id_order).limit(page_size).values_list("id")
+            return [(True, None, job_id) for (job_id,) in rows]
+
+        query = query.filter(**{f"{field}__isnull": False})
+        if after is not None:
+            _, value, job_id = after
+            query = query.filter(
+                Q(**{f"{field}__{op}": value})
+                | Q(**{field: value, f"id__{op}": job_id}),
+            )
+        rows = (
+            await query
+            .order_by(order_by, id_order)
+            .limit(page_size)
+            .values_list(field, "id")
+        )
+        page = [(False, value, job_id) for value, job_id in rows]
+        if len(page) < page_size:
+            page += await cls._contactable_page(
+                order_by,
+                page_size - len(page),
+                (True, None, None),
             )
+        return page
 
-        boss_name = data.get("bossInfo", {}).get("name")
-        if brand_name and boss_name:
-            result &= (
-                not await UserBlack
-                .filter(
-                    info__isnull=False,
-                    name__isnull=False,
-                    info__contains=brand_name,
-                    name=boss_name,
+    @classmethod
+    async def stream_contactable_ids(
+        cls,
+        page_size: int = 40,
+        order_by: str = "id",
+    ) -> AsyncIterator[list[str]]:
+        # Yields every contactable id page by page in constant memory; the
+        # next page is already being fetched while the caller works on this
+        # one. Rows contacted meanwhile simply drop out of later pages.
+        task = asyncio.create_task(cls._contactable_page(order_by, page_size, None))
+        last = None
+        try:
+            while page := await task:
+                # A key that does not move means the stored values do not
+                # compare like the bound ones; stop rather than loop forever.
+                if page[-1] == last:
+                    logger.warning(f"Contactable stream stuck at {last}, stopping")
+                    return
+                last = page[-1]
+                task = asyncio.create_task(
+                    cls._contactable_page(order_by, page_size, last),
                 )
-                .limit(1)
-                .exists()
-            )
+                yield [job_id for _, _, job_id in page]
+        finally:
+            task.cancel()
 
-        condition = Q(contacted=True)
+    def get_detail(self) -> Any:
+        return self.detail if self.detail is not None else self.detail_zstd
 
-        user_match = Q(user_id=self.user_id) & Q(user_id__isnull=False)
+    def set_projection(self, data: dict[str, Any]) -> None:
+        for name, value in zip(PROJECTION_FIELDS, project_detail(data)):
+            setattr(self, name, value)
 
-        brand_match = Q()
-        if "1000人" not in str(self.detail) and self.brand_id:
-            brand_match = Q(brand_id=self.brand_id) & Q(brand_id__isnull=False)
+    def _brand_key(self) -> str | None:
+        # Large companies are matched per boss only, never per brand.
+        if self.brand_id and not self.large_company:
+            return self.brand_id
+        return None
 
-        condition &= user_match | brand_match
+    async def is_acceptable(self) -> bool:
+        if await blocklist_index.is_blocked(self.brand_name, self.boss_name):
+            return False
+
+        # Two lookups instead of one OR so that each one stays index-only on
+        # (contacted, user_id) / (contacted, brand_id).
+        if (
+            self.user_id
+            and await Job.filter(contacted=True, user_id=self.user_id).exists()
+        ):
+            return False
+
+        brand_key = self._brand_key()
+        return not (
+            brand_key
+            and await Job.filter(contacted=True, brand_id=brand_key).exists()
+        )
 
-        exists_in_job = await Job.filter(condition).limit(1).exists()
+    @classmethod
+    async def evaluate_acceptability(cls, jobs: list["Job"]) -> dict[str, bool]:
+        user_ids = {job.user_id for job in jobs if job.user_id}
+        brand_ids = {key for job in jobs if (key := job._brand_key())}
+
+        contacted_users: set[str] = set()
+        if user_ids:
+            contacted_users = set(
+                await cls
+                .filter(contacted=True, user_id__in=list(user_ids))
+                .values_list("user_id", flat=True),
+            )
+        contacted_brands: set[str] = set()
+        if brand_ids:
+            contacted_brands = set(
+                await cls
+                .filter(contacted=True, brand_id__in=list(brand_ids))
+                .values_list("brand_id", flat=True),
+            )
 
-        return result and not exists_in_job
+        verdicts: dict[str, bool] = {}
+        rejected: list[str] = []
+        seen_users: set[str] = set()
+        seen_brands: set[str] = set()
+        for job in jobs:
+            brand_key = job._brand_key()
+            if (
+                job.user_id in contacted_users
+                or brand_key in contacted_brands
+                or await blocklist_index.is_blocked(job.brand_name, job.boss_name)
+            ):
+                verdicts[job.id] = False
+                rejected.append(job.id)
+                continue
+            # Only the first job per boss/brand in a batch is cleared; the rest
+            # are left undecided until that one has been contacted.
+            if job.user_id in seen_users or brand_key in seen_brands:
+                continue
+            if job.user_id:
+                seen_users.add(job.user_id)
+            if brand_key:
+                seen_brands.add(brand_key)
+            verdicts[job.id] = True
+
+        if rejected:
+            # Same flag PydollService.greet sets on a job it turns down, so
+            # every contacted-based filter keeps treating them alike.
+            await cls.filter(id__in=rejected).update(contacted=True)
+            for job_id in rejected:
+                add_resolved(job_id)
+
+        return verdicts
+
+    @classmethod
+    async def reject(cls, job_ids: list[str]) -> None:
+        if not job_ids:
+            return
+        await cls.bulk_create(
+            [cls(id=job_id, acceptable=False) for job_id in job_ids],
+            on_conflict=["id"],
+            update_fields=["acceptable"],
+        )
+        for job_id in job_ids:
+            add_resolved(job_id)
+
+    @classmethod
+    async def mark_contacted(cls, job_id: str) -> None:
+        # One upsert of the flag; the detail is neither read nor rewritten.
+        await cls.bulk_create(
+            [cls(id=job_id, contacted=True)],
+            on_conflict=["id"],
+            update_fields=["contacted"],
+        )
+        add_resolved(job_id)
+
+    @classmethod
+    async def inspection_times(cls, job_ids: list[str]) -> dict[str, datetime]:
+        # Aware UTC, as stored since migration 0006.
+        if not job_ids:
+            return {}
+        rows = (
+            await cls
+            .filter(id__in=job_ids, last_inspection_time__isnull=False)
+            .values_list("id", "last_inspection_time")
+        )
+        return dict(rows)
 
     @classmethod
     async def is_resolved(cls, job_id: str) -> bool:
-        return (
+        return job_id in await cls.resolved_ids([job_id])
+
+    @classmethod
+    async def resolved_ids(cls, job_ids: list[str]) -> set[str]:
+        candidates = set(job_ids)
+        bloom = get_resolved_filter()
+        if bloom is not None:
+            candidates = {job_id for job_id in candidates if job_id in bloom}
+        if not candidates:
+            return set()
+        resolved = set(
             await cls
-            .filter(id=job_id)
+            .filter(id__in=list(candidates))
             .filter(
                 Q(contacted=True) | Q(acceptable=False),
             )
-            .exists()
+            .values_list("id", flat=True),
+        )
+        if bloom is not None:
+            bloom.record_db_check(len(candidates), len(resolved))
+        return resolved
+
+
+async def _backfill_columns(
+    version: int,
+    step: int,
+    resume_after: str,
+    *,
+    columns: tuple[str, ...],
+    batch_size: int = 500,
+) -> None:
+    # Keyset over id in small batches, never one statement over the whole
+    # table; the last id written is the resume marker.
+    conn = Tortoise.get_connection("default")
+    filled = 0
+    while jobs := (
+        await Job
+        .filter(id__gt=resume_after, detail__isnull=False)
+        .order_by("id")
+        .limit(batch_size)
+        .only("id", "detail")
+    ):
+        for job in jobs:
+            detail = decode_detail(job.detail)
+            if isinstance(detail, dict):
+                job.set_projection(detail)
+        await Job.bulk_update(jobs, fields=list(columns))
+        resume_after = jobs[-1].id
+        await _save_progress(conn, version, step, resume_after)
+        filled += len(jobs)
+    logger.info(f"Filled {', '.join(columns)} on {filled} jobs")
+
+
+async def _normalize_inspection_times(
+    version: int,
+    step: int,
+    resume_after: str,
+    batch_size: int = 500,
+) -> None:
+    # Older rows hold local time: naive wall-clock on MySQL, text with a
+    # local offset (or none) on SQLite. Each becomes aware UTC, what every
+    # write stores now. A batch and its resume marker commit together, so
+    # no row is converted twice. Runs before any crawl writes, so on MySQL
+    # every naive value it reads is still local time.
+    placeholder = "?" if get_dialect() == "sqlite" else "%s"
+    utc = timezone.get_default_timezone()
+    converted = 0
+    while rows := await Tortoise.get_connection("default").execute_query_dict(
+        f"SELECT id, last_inspection_time FROM job "
+        f"WHERE id > {placeholder} AND last_inspection_time IS NOT NULL "
+        f"ORDER BY id LIMIT {batch_size}",
+        [resume_after],
+    ):
+        values = []
+        for row in rows:
+            inspected = row["last_inspection_time"]
+            if isinstance(inspected, str):
+                inspected = datetime.fromisoformat(inspected)
+            values.append([inspected.astimezone(utc), row["id"]])
+        resume_after = rows[-1]["id"]
+        async with in_transaction("default") as conn:
+            await conn.execute_many(
+                f"UPDATE job SET last_inspection_time = {placeholder} "
+                f"WHERE id = {placeholder}",
+                values,
+            )
+            await _save_progress(conn, version, step, resume_after)
+        converted += len(rows)
+    logger.info(f"Converted last_inspection_time to UTC on {converted} jobs")
+
+
+# Data steps run after a migration's statements, keyed by version.
+DATA_MIGRATIONS: dict[int, Callable[[int, int, str], Awaitable[None]]] = {
+    1: partial(_backfill_columns, columns=("user_id", "brand_id")),
+    2: partial(_backfill_columns, columns=PROJECTION_FIELDS),
+    6: _normalize_inspection_times,
+}
+
+
+async def backfill_projection(batch_size: int = 500) -> None:
+    # Migration 0002 fills the projection of existing rows; this re-runs it
+    # by hand and rewrites double-encoded details as plain JSON on the way.
+    await init_db()
+    cursor = ""
+    projected = repaired = 0
+    try:
+        while jobs := (
+            await Job
+            .filter(id__gt=cursor, detail__isnull=False)
+            .order_by("id")
+            .limit(batch_size)
+            .only("id", "detail")
+        ):
+            cursor = jobs[-1].id
+            double_encoded = [job for job in jobs if isinstance(job.detail, str)]
+            for job in jobs:
+                job.detail = decode_detail(job.detail)
+                if isinstance(job.detail, dict):
+                    job.set_projection(job.detail)
+            async with in_transaction("default"):
+                await Job.bulk_update(jobs, fields=list(PROJECTION_FIELDS))
+                if double_encoded:
+                    await Job.bulk_update(double_encoded, fields=["detail"])
+            projected += len(jobs)
+            repaired += len(double_encoded)
+            logger.info(f"Backfilled {projected} jobs ({repaired} re-encoded)")
+    finally:
+        await close_db()
+
+
+async def train_detail_dictionary() -> int | None:
+    samples = (
+        await Job
+        .filter(detail__isnull=False)
+        .order_by("-last_inspection_time")
+        .limit(Config.DETAIL_DICT_SAMPLES)
+        .values_list("detail", flat=True)
+    )
+    codec = get_detail_codec()
+    data = codec.train(
+        [orjson.dumps(decode_detail(detail)) for detail in samples],
+        Config.DETAIL_DICT_SIZE,
+    )
+    if data is None:
+        return None
+    dict_id = codec.add_dictionary(data)
+    await ZstdDict.create(id=dict_id, data=data, created_at=timezone.now())
+    logger.info(f"Trained zstd dictionary {dict_id} from {len(samples)} details")
+    return dict_id
+
+
+async def compress_details(batch_size: int = 500) -> None:
+    # Moves every plain detail into detail_zstd, training the shared
+    # dictionary first if there is none yet.
+    await init_db()
+    codec = get_detail_codec()
+    compressed = 0
+    try:
+        if not await ZstdDict.exists():
+            await train_detail_dictionary()
+        cursor = ""
+        while jobs := (
+            await Job
+            .filter(id__gt=cursor, detail__isnull=False)
+            .order_by("id")
+            .limit(batch_size)
+            .only("id", "detail")
+        ):
+            cursor = jobs[-1].id
+            for job in jobs:
+                detail = decode_detail(job.detail)
+                if isinstance(detail, dict):
+                    job.set_projection(detail)
+                job.detail, job.detail_zstd = None, codec.compress(detail)
+            async with in_transaction("default"):
+                await Job.bulk_update(
+                    jobs,
+                    fields=["detail", "detail_zstd", *PROJECTION_FIELDS],
+                )
+            compressed += len(jobs)
+            logger.info(f"Compressed {compressed} job details: {codec.stats()}")
+    finally:
+        await close_db()
+
+
+class JobWriter:
+    # Coalesces detail results per job id and writes them with one multi-row
+    # upsert, so a handler never waits on a read-then-write round trip.
+    COLUMNS = (
+        "id",
+        "acceptable",
+        "contacted",
+        "last_inspection_time",
+        "detail",
+        "detail_zstd",
+        *PROJECTION_FIELDS,
+    )
+
+    def __init__(self, max_size: int = 50, max_delay: float = 5.0) -> None:
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.written = 0
+        self._buffer: dict[str, tuple[Any, ...]] = {}
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    async def add(self, job_id: str, acceptable: bool, detail: Any) -> None:
+        detail = decode_detail(detail)
+        if compress_detail_enabled():
+            plain, compressed = None, get_detail_codec().compress(detail)
+        else:
+            plain, compressed = orjson.dumps(detail).decode(), None
+        # last_inspection_time is bound as aware UTC, the same value the ORM
+        # binds for it, so rows written here and the keyset filters over them
+        # use one representation (SQLite compares them as text).
+        self._buffer[job_id] = (
+            job_id,
+            acceptable,
+            False,
+            timezone.now(),
+            plain,
+            compressed,
+            *project_detail(detail),
         )
+        if len(self._buffer) >= self.max_size:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay)
+        # Shielded so that cancelling the timer only ever interrupts the
+        # sleep, never a batch that is being written.
+        await asyncio.shield(self.flush())
+
+    async def flush(self, *, requeue: bool = True) -> None:
+        async with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, {}
+            try:
+                await self._upsert(list(rows.values()))
+            except Exception as e:
+                logger.exception(f"数据库入库失败: {type(e).__name__}: {e}")
+                # Results that arrived meanwhile are newer than the failed ones.
+                self._buffer = {**rows, **self._buffer}
+                if not requeue:
+                    raise
+                return
+            self.written += len(rows)
+            for job_id, row in rows.items():
+                if row[1] is False:
+                    add_resolved(job_id)
+            logger.info(f"Jobs saved: {len(rows)}")
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=5),
+        reraise=True,
+    )
+    async def _upsert(self, rows: list[tuple[Any, ...]]) -> None:
+        conn = Tortoise.get_connection("default")
+        columns = ", ".join(self.COLUMNS)
+        values = [value for row in rows for value in row]
+        updated = [column for column in self.COLUMNS if column != "id"]
+        if get_dialect() == "sqlite":
+            row = "(" + ", ".join(["?"] * len(self.COLUMNS)) + ")"
+            assignments = ", ".join(
+                "contacted = COALESCE(job.contacted, excluded.contacted)"
+                if column == "contacted"
+                else f"{column} = excluded.{column}"
+                for column in updated
+            )
+            sql = (
+                f"INSERT INTO job ({columns}) VALUES {', '.join([row] * len(rows))} "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}"
+            )
+        else:
+            row = "(" + ", ".join(["%s"] * len(self.COLUMNS)) + ")"
+            assignments = ", ".join(
+                "contacted = COALESCE(contacted, VALUES(contacted))"
+                if column == "contacted"
+                else f"{column} = VALUES({column})"
+                for column in updated
+            )
+            sql = (
+                f"INSERT INTO job ({columns}) VALUES {', '.join([row] * len(rows))} "
+                f"ON DUPLICATE KEY UPDATE {assignments}"
+            )
+        await conn.execute_query(sql, values)
+
+    async def close(self) -> None:
+        # A timed flush already writing holds the lock, so the final flush
+        # waits for it; the rows left after that are written or raised.
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        await self.flush(requeue=False)
+        if compress_detail_enabled():
+            logger.info(f"Detail compression: {get_detail_codec().stats()}")
@@ -1,9 +1,7 @@
-import itertools
-import random
-from datetime import timedelta
+from collections import Counter
+from datetime import datetime, timedelta
 from typing import Any
 
-import arrow
 import orjson
 import psutil
 from crawlee import ConcurrencySettings, Request, service_locator
@@ -20,21 +18,35 @@ from tenacity import (
     stop_after_attempt,
     wait_exponential,
 )
+from tortoise import timezone
+from tortoise.expressions import Q
 from yarl import URL
 
 from config import Config
 from validators import job_detail_schema, job_schema
 
-from .items import Job, init_db
-from .mongodb import insert_job_detail, insert_jobs
+from .frontier import CrawlFrontier, ParamSpace, parse_shard
+from .items import Job, JobWriter, blocklist_index, close_db, init_db
 from .pydoll_service import PydollService
-from .util import CityUtils, DataSanitizer, job_to_job_detail
+from .scheduler import QueryScheduler
+from .storage import close_document_store, insert_job_detail, insert_jobs
+from .util import CityUtils, DataSanitizer, JobCard, job_to_job_detail
+from .validation import benchmark, check_parity, compile_validator
 
 sanitizer = DataSanitizer()
+job_validator = compile_validator(job_schema)
+job_detail_validator = compile_validator(job_detail_schema)
 
 
 async def main() -> None:
     await init_db()
+    await Job.init_resolved_filter()
+
+    if Config.cfg.sanitizer_cache_entries:
+        sanitizer.enable_cache(
+            max_entries=Config.cfg.sanitizer_cache_entries,
+            max_bytes=Config.cfg.sanitizer_cache_mb * 1024 * 1024,
+        )
 
     available_mb = psutil.virtual_memory().available / (1024**2)
     max_concurrency = max(1, int(available_mb / 800))
@@ -71,6 +83,48 @@ async def main() -> None:
     pydoll_service = PydollService()
     await pydoll_service.start()
 
+    job_writer = JobWriter(
+        max_size=Config.JOB_WRITE_BATCH_SIZE,
+        max_delay=Config.JOB_WRITE_INTERVAL_SECONDS,
+    )
+    scheduler = QueryScheduler(
+        Config.QUERY_STATS_PATH,
+        min_interval=Config.QUERY_MIN_INTERVAL_HOURS * 3600,
+        max_interval=Config.QUERY_MAX_INTERVAL_HOURS * 3600,
+    )
+    city_codes = [
+        code
+        for city in Config.cfg.citys
+        for code in CityUtils.expand_city_codes(city)
+    ]
+    frontier = CrawlFrontier(
+        ParamSpace(
+            city_codes,
+            Config.cfg.querys,
+            Config.cfg.salarys if Config.cfg.use_session_account else [""],
+        ),
+        parse_shard(Config.cfg.shard),
+        lease=timedelta(minutes=Config.FRONTIER_LEASE_MINUTES),
+    )
+    detail_ttl = timedelta(hours=Config.cfg.detail_ttl_hours)
+    counters: Counter[str] = Counter()
+    # securityId differs between list responses, so detail requests are
+    # keyed by job id instead, together with the job's last inspection time.
+    # The request queue persists: a request still pending from an earlier
+    # run has the same key and is not queued twice, while a job fetched
+    # since then has a new inspection time, so its stale re-fetch gets
+    # through. A job never inspected has no such time and is keyed by run,
+    # so a fetch that failed or wrote nothing is tried again next run.
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    seen_details: set[str] = set()
+
+    async def complete_list(ctx: BasicCrawlingContext) -> None:
+        # List requests from an earlier run may belong to another grid.
+        if marker := ctx.request.user_data.get("frontier"):
+            key, position = marker
+            if key == frontier.key:
+                await frontier.complete(position)
+
     @crawler.error_handler
     async def error_handler(ctx: BasicCrawlingContext, error: Exception) -> None:
         error_type = type(error).__name__
@@ -94,35 +148,100 @@ async def main() -> None:
     @crawler.router.handler("list")
     async def list_handler(ctx: BasicCrawlingContext) -> None:
         ctx.log.info(f"list_handler is processing {ctx.request.url}")
+        # The shard's remaining pages belong to whichever worker took over
+        # its lease.
+        marker = ctx.request.user_data.get("frontier")
+        if frontier.lost and marker and marker[0] == frontier.key:
+            logger.info(f"Skipping {ctx.request.url}: shard lease lost")
+            return
         joblist = await pydoll_service.get_joblist(ctx.request.url)
         requests: list[Request] = []
         jobs_to_insert: list[dict[str, Any]] = []
+        if Config.cfg.sanitize_workers and len(joblist) >= Config.OFFLOAD_MIN_ITEMS:
+            joblist = await sanitizer.clean_async(
+                joblist,
+                workers=Config.cfg.sanitize_workers,
+            )
+        else:
+            for job in joblist:
+                sanitizer.clean(job)
         for job in joblist:
-            sanitizer.clean(job)
             jobs_to_insert.append(job)
+        new_jobs = 0
         if jobs_to_insert:
             await insert_jobs(jobs_to_insert)
 
+            resolved = await Job.resolved_ids([
+                job["encryptJobId"]
+                for job in jobs_to_insert
+                if job.get("encryptJobId")
+            ])
+            candidates: list[dict[str, Any]] = []
+            rejected: list[str] = []
             for job in jobs_to_insert:
                 job_id = job.get("encryptJobId")
-                if job_id and not await Job.is_resolved(job_id):
-                    job_sec_id = job.get("securityId")
-                    if not job_sec_id:
-                        continue
-                    logger.info(f"Queuing detail for securityId: {job_sec_id}")
-                    requests.append(
-                        Request.from_url(
-                            str(
-                                URL(Config.JOB_DETAIL_API_URL).with_query({
-                                    "securityId": job_sec_id,
-                                }),
-                            ),
-                            label="detail",
-                            user_data={"item": job},
-                            forefront=True,
+                if not job_id or job_id in resolved:
+                    continue
+                if job_id in seen_details:
+                    counters["duplicate_suppressed"] += 1
+                    continue
+                # The card alone is often enough to know the detail would be
+                # rejected, so those jobs never cost a detail navigation.
+                if not job_validator.validate(job):
+                    counters["schema_rejected"] += 1
+                    rejected.append(job_id)
+                elif await blocklist_index.is_blocked(
+                    job.get("brandName"),
+                    job.get("bossName"),
+                ):
+                    counters["blocklist_rejected"] += 1
+                    rejected.append(job_id)
+                else:
+                    candidates.append(job)
+            await Job.reject(rejected)
+            inspected = await Job.inspection_times([
+                job["encryptJobId"] for job in candidates
+            ])
+            cutoff = timezone.now() - detail_ttl
+            unseen: list[dict[str, Any]] = []
+            stale: list[tuple[datetime, dict[str, Any]]] = []
+            for job in candidates:
+                inspected_at = inspected.get(job["encryptJobId"])
+                if inspected_at is None:
+                    unseen.append(job)
+                elif inspected_at < cutoff:
+                    stale.append((inspected_at, job))
+                else:
+                    counters["fresh_skipped"] += 1
+            new_jobs = len(unseen)
+            # Forefront requests are taken LIFO, so the most recently inspected
+            # go in first and never-seen jobs last, to be fetched first.
+            stale.sort(key=lambda pair: pair[0], reverse=True)
+            for inspected_at, job in [*stale, *((None, job) for job in unseen)]:
+                job_sec_id = job.get("securityId")
+                if not job_sec_id:
+                    continue
+                seen_details.add(job["encryptJobId"])
+                version = inspected_at.isoformat() if inspected_at else f"new:{run_id}"
+                logger.info(f"Queuing detail for securityId: {job_sec_id}")
+                requests.append(
+                    Request.from_url(
+                        str(
+                            URL(Config.JOB_DETAIL_API_URL).with_query({
+                                "securityId": job_sec_id,
+                            }),
                         ),
-                    )
+                        label="detail",
+                        unique_key=f"detail:{job['encryptJobId']}:{version}",
+                        user_data={"job": JobCard.from_job(job).pack()},
+                        forefront=True,
+                    ),
+                )
+            counters["detail_queued"] += len(requests)
+        if query_key := ctx.request.user_data.get("query_key"):
+            scheduler.record(query_key, len(jobs_to_insert), new_jobs)
         await ctx.add_requests(requests)
+        await complete_list(ctx)
 
     @crawler.router.handler("detail")
     @retry(
@@ -133,6 +252,20 @@ async def main() -> None:
     )
     async def detail_handler(ctx: BasicCrawlingContext) -> None:
         ctx.log.info(f"detail_handler is processing {ctx.request.url}")
+        # Requests left in the queue by an earlier run are not in the
+        # seen-set yet; claim them so list pages stop re-queuing the job.
+        user_data = ctx.request.user_data
+        if "job" in user_data:
+            try:
+                card = JobCard.unpack(user_data["job"])
+            except ValueError as e:
+                logger.warning(f"Dropping detail request {ctx.request.url}: {e}")
+                return
+        else:
+            # Requests queued before cards were packed carry the whole dict.
+            card = JobCard.from_job(user_data.get("item") or {})
+        if card.encryptJobId:
+            seen_details.add(card.encryptJobId)
         data: dict[str, Any] | None = None
         try:
             stoken = await pydoll_service._ensure_token()
@@ -153,8 +286,7 @@ async def main() -> None:
             logger.exception(f"获取详情失败: {type(e).__name__}: {e}")
         if not data:
             logger.info("Falling back to authenticated service for job details")
-            item = ctx.request.user_data.get("item")
-            data = await pydoll_service.get_job_detail(job_to_job_detail(item))
+            data = await pydoll_service.get_job_detail(job_to_job_detail(card))
 
         if data:
             sanitizer.clean(data)
@@ -166,18 +298,13 @@ async def main() -> None:
             if not job_id:
                 logger.warning("No encryptId found in job details")
                 return
-            try:
-                job = await Job.get_or_none(id=job_id)
-                if job is None:
-                    job = Job(id=job_id)
-                job.acceptable = job_detail_schema.validate(data)
-                job.detail = data
-                job.contacted = False
-                job.last_inspection_time = arrow.Arrow.now().datetime
-                await job.save()
-                logger.info(f"Job saved: {job.id}")
-            except Exception as e:
-                logger.exception(f"数据库入库失败: {type(e).__name__}: {e}")
+            acceptable = job_detail_validator.validate(data)
+            if not acceptable:
+                logger.opt(lazy=True).debug(
+                    "Detail rejected: {}",
+                    lambda: job_detail_validator.errors,
+                )
+            await job_writer.add(job_id, acceptable=acceptable, detail=data)
         else:
             logger.warning("未能获取有效的职位详情数据")
 
@@ -185,6 +312,8 @@ async def main() -> None:
     async def failed_handler(ctx: BasicCrawlingContext, error: Exception) -> None:
         ctx.log.error(f"Failed request: {ctx.request.url}")
         logger.exception(error)
+        if ctx.request.label == "list":
+            await complete_list(ctx)
         try:
             if hasattr(pydoll_service, "tab") and pydoll_service.tab:
                 await pydoll_service.tab.take_screenshot("error.png", quality=100)
@@ -193,23 +322,22 @@ async def main() -> None:
 
     @crawler.router.default_handler
     async def request_handler(ctx: BasicCrawlingContext) -> None:
-        params = list(
-            itertools.product(
-                Config.cfg.citys,
-                Config.cfg.querys,
-                Config.cfg.salarys if Config.cfg.use_session_account else [""],
-            ),
+        if not frontier.acquired and not await frontier.acquire():
+            logger.info("No crawl frontier shard to work on.")
+            return
+        manager = await crawler.get_request_manager()
+        added = 0
+        taken = frontier.take(
+            Config.LIST_REQUESTS_PER_RUN,
+            lambda params: scheduler.is_due(QueryScheduler.key(*params)),
         )
-        state = await ctx.use_state({
-            "start": random.randint(0, max(0, len(params) - 1)),
-        })
-        requests: list[Request] = []
-        end = min(state["start"] + 10, len(params))
+        # Resting combinations were passed over; keep that progress too.
+        await frontier.save()
 
-        if state["start"] < len(params):
-            for city, query, salary in params[state["start"] : end]:
+        if taken:
+            for position, (city_code, query, salary) in taken:
                 query_params = {
-                    "city": CityUtils.get_city_code_by_name(city),
+                    "city": city_code,
                     "query": query,
                 }
                 if Config.cfg.use_session_account:
@@ -219,21 +347,83 @@ async def main() -> None:
                     if salary:
                         query_params["salary"] = salary
                 url = str(URL(Config.JOB_URL).with_query(query_params))
-                requests.append(
+                # Keyed by shard and cursor position, which grows with every
+                # pass. A position still in flight when a run was interrupted
+                # or its lease lost is taken again on resume; it then maps to
+                # the request already in the persisted queue, and one already
+                # handled there only has its completion recorded.
+                processed = await manager.add_request(
                     Request.from_url(
                         url,
                         label="list",
+                        unique_key=f"list:{frontier.key}:{position}:{url}",
+                        user_data={
+                            "query_key": QueryScheduler.key(city_code, query, salary),
+                            "frontier": [frontier.key, position],
+                        },
                     ),
                 )
-            await ctx.add_requests(requests)
-            state["start"] = end
-            logger.info(f"Added {len(requests)} list requests. Next start index: {end}")
+                if processed is None or not processed.was_already_present:
+                    added += 1
+                elif processed.was_already_handled:
+                    await frontier.complete(position)
+            logger.info(f"Added {added} list requests.")
         else:
-            logger.info("All params processed or start index out of bounds.")
+            logger.info("No query combination is due for a revisit.")
 
-    await crawler.run([
-        Request.from_url(
-            Config.BASE_URL,
-            always_enqueue=True,
-        ),
-    ])
+    try:
+        await crawler.run([
+            Request.from_url(
+                Config.BASE_URL,
+                always_enqueue=True,
+            ),
+        ])
+    finally:
+        try:
+            await job_writer.close()
+        finally:
+            await frontier.save(release=True)
+            await close_document_store()
+            scheduler.save()
+            sanitizer.shutdown_pool()
+            Job.save_resolved_filter()
+            await close_db()
+
+    saved = sum(
+        counters[key]
+        for key in (
+            "fresh_skipped",
+            "schema_rejected",
+            "blocklist_rejected",
+            "duplicate_suppressed",
+        )
+    )
+    logger.info(f"Detail requests: {dict(counters)}, navigations saved: {saved}")
+
+    if stats := sanitizer.cache_stats():
+        logger.info(f"Sanitizer cache: {stats}")
+
+
+async def bench_validators(limit: int = 2000) -> None:
+    await init_db()
+    try:
+        jobs = (
+            await Job
+            .filter(Q(detail__isnull=False) | Q(detail_zstd__isnull=False))
+            .limit(limit)
+            .only("id", "detail", "detail_zstd")
+        )
+    finally:
+        await close_db()
+    details = [job.get_detail() for job in jobs]
+    mismatches = check_parity(job_detail_schema, job_detail_validator, details)
+    logger.info(
+        f"job_detail_schema compiled={job_detail_validator.compiled}, "
+        f"parity mismatches: {len(mismatches)}/{len(details)}",
+    )
+    for i in mismatches[:10]:
+        logger.warning(f"Parity mismatch on {jobs[i].id}")
+    logger.info(
+        f"job_detail_schema timings: "
+        f"{benchmark(job_detail_schema, job_detail_validator, details)}",
+    )
@@ -1,11 +1,24 @@
+import asyncio
 import os
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import blake2b
+from typing import Any
 
 import certifi
+import orjson
 import psutil
+from loguru import logger
 from pymongo import AsyncMongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from pymongo.server_api import ServerApi
 from tenacity import retry, stop_after_attempt, wait_fixed
 
+from config import Config
+
+HASH_FIELD = "_hash"
+DUPLICATE_KEY_ERROR = 11000
+
 
 def _get_memory_based_config() -> dict:
     available_gb = psutil.virtual_memory().available / (1024**3)
@@ -85,32 +98,226 @@ async def insert_job(item) -> None:
     )
 
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
-async def insert_jobs(items: list) -> None:
-    if not items:
-        return
-    operations = [
-        UpdateOne(
-            {"_id": item.get("encryptJobId")},
-            {"$set": item},
-            upsert=True,
+VOLATILE_FIELDS = frozenset({"lid", "securityId", HASH_FIELD})
+
+
+def fingerprint(doc: dict) -> str:
+    stable = {k: v for k, v in doc.items() if k not in VOLATILE_FIELDS}
+    return blake2b(
+        orjson.dumps(stable, option=orjson.OPT_SORT_KEYS, default=str),
+        digest_size=16,
+    ).hexdigest()
+
+
+class WriteBehindBuffer:
+    # Upserts are coalesced by _id (last write wins) and flushed as one
+    # unordered bulk_write once max_ops are queued or max_delay_ms has passed.
+    # put() blocks while max_pending documents are queued or in flight.
+    def __init__(
+        self,
+        collection: str,
+        max_ops: int = 200,
+        max_delay_ms: int = 1000,
+        max_pending: int = 2000,
+        max_known_hashes: int = 50_000,
+    ) -> None:
+        self.collection = collection
+        self.max_ops = max_ops
+        self.max_delay = max_delay_ms / 1000
+        self.max_pending = max_pending
+        self.max_known_hashes = max_known_hashes
+        self._ops: dict[Any, tuple[dict, str]] = {}
+        self._known: OrderedDict[Any, str] = OrderedDict()
+        self._inflight = 0
+        self.totals = {"written": 0, "unchanged": 0, "retried": 0, "dead_lettered": 0}
+        self._flush_lock = asyncio.Lock()
+        self._cond = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    def _remember(self, key: Any, digest: str) -> None:
+        self._known[key] = digest
+        self._known.move_to_end(key)
+        if len(self._known) > self.max_known_hashes:
+            self._known.popitem(last=False)
+
+    async def put(self, key: Any, doc: dict) -> None:
+        digest = fingerprint(doc)
+        if self._known.get(key) == digest and key not in self._ops:
+            self._known.move_to_end(key)
+            self.totals["unchanged"] += 1
+            return
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: key in self._ops
+                or len(self._ops) + self._inflight < self.max_pending,
+            )
+            self._ops[key] = (doc, digest)
+        if len(self._ops) >= self.max_ops:
+            self._wakeup.set()
+        if not self._closing and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_delay)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._ops:
+                return
+            ops, self._ops = self._ops, {}
+            self._inflight = len(ops)
+            try:
+                stats = await _bulk_upsert(self.collection, ops)
+                for key, (_, digest) in ops.items():
+                    if key not in stats["failed"]:
+                        self._remember(key, digest)
+                del stats["failed"]
+                for name, count in stats.items():
+                    self.totals[name] += count
+                logger.debug(f"Mongo {self.collection} flush: {stats}")
+            except Exception as e:
+                logger.exception(
+                    f"Mongo flush to {self.collection} failed: {type(e).__name__}: {e}",
+                )
+            finally:
+                self._inflight = 0
+                async with self._cond:
+                    self._cond.notify_all()
+
+    async def close(self) -> None:
+        # The flusher is asked to stop, not cancelled, so a batch it is
+        # writing completes; whatever was queued after it goes out below.
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+        self._task = None
+        await self.flush()
+        logger.info(f"Mongo {self.collection} writes: {self.totals}")
+
+
+async def _bulk_upsert(
+    collection: str,
+    ops: dict[Any, tuple[dict, str]],
+) -> dict[str, Any]:
+    # Unordered writes apply every operation they can; only the indexes named
+    # in BulkWriteError.details are retried, and leftovers are dead-lettered.
+    # The $ne filter skips documents whose stored hash already matches; the
+    # upsert then collides on _id, so that duplicate-key error means unchanged.
+    pending = list(ops.items())
+    stats: dict[str, Any] = {
+        "written": 0,
+        "unchanged": 0,
+        "retried": 0,
+        "dead_lettered": 0,
+        "failed": set(),
+    }
+    errors: dict[Any, str] = {}
+    for attempt in range(Config.MONGO_WRITE_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(min(10, 0.5 * 2 ** (attempt - 1)))
+            stats["retried"] += len(pending)
+        try:
+            await get_mongo_database()[collection].bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": key, HASH_FIELD: {"$ne": digest}},
+                        {"$set": {**doc, HASH_FIELD: digest}},
+                        upsert=True,
+                    )
+                    for key, (doc, digest) in pending
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            failed = {}
+            unchanged = 0
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") == DUPLICATE_KEY_ERROR:
+                    unchanged += 1
+                else:
+                    failed[err["index"]] = err.get("errmsg", "")
+            stats["unchanged"] += unchanged
+            stats["written"] += len(pending) - len(failed) - unchanged
+            errors = {pending[i][0]: msg for i, msg in failed.items()}
+            pending = [pending[i] for i in sorted(failed)]
+        except PyMongoError as e:
+            errors = {key: f"{type(e).__name__}: {e}" for key, _ in pending}
+        else:
+            stats["written"] += len(pending)
+            pending = []
+        if not pending:
+            break
+
+    if pending:
+        _dead_letter(collection, pending, errors)
+        stats["dead_lettered"] = len(pending)
+        stats["failed"] = {key for key, _ in pending}
+    return stats
+
+
+def _dead_letter(
+    collection: str,
+    pending: list[tuple[Any, dict]],
+    errors: dict[Any, str],
+) -> None:
+    path = Config.MONGO_DEAD_LETTER_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    failed_at = datetime.now().isoformat()
+    with path.open("ab") as f:
+        for key, (doc, _) in pending:
+            f.write(
+                orjson.dumps(
+                    {
+                        "collection": collection,
+                        "_id": key,
+                        "error": errors.get(key),
+                        "failed_at": failed_at,
+                        "doc": doc,
+                    },
+                    default=str,
+                )
+                + b"\n",
+            )
+    logger.warning(f"Dead-lettered {len(pending)} {collection} writes to {path}")
+
+
+class MongoDocumentStore:
+    def __init__(self) -> None:
+        self._buffers = {
+            "job": WriteBehindBuffer("job"),
+            "job_detail": WriteBehindBuffer("job_detail"),
+        }
+
+    async def upsert(self, collection: str, key: Any, doc: dict) -> None:
+        await self._buffers[collection].put(key, doc)
+
+    async def put_many(self, collection: str, docs: dict[Any, dict]) -> None:
+        # Through the write-behind buffer, like upsert: unchanged documents
+        # are skipped and the caller never waits on the round trip.
+        buffer = self._buffers[collection]
+        for key, doc in docs.items():
+            await buffer.put(key, doc)
+
+    async def upsert_many(self, collection: str, docs: dict[Any, dict]) -> set[Any]:
+        # Written straight through, bypassing the buffer; returns failed keys.
+        # Only for ship_upstream, which needs to know what failed.
+        stats = await _bulk_upsert(
+            collection,
+            {key: (doc, fingerprint(doc)) for key, doc in docs.items()},
         )
-        for item in items
-        if isinstance(item, dict) and item.get("encryptJobId")
-    ]
-    if operations:
-        await get_mongo_database()["job"].bulk_write(operations)
+        return stats["failed"]
 
+    async def get(self, collection: str, key: Any) -> dict | None:
+        return await get_mongo_database()[collection].find_one({"_id": key})
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
-async def insert_job_detail(item) -> None:
-    if not isinstance(item, dict):
-        return
-    job_id = item.get("jobInfo", {}).get("encryptId")
-    if not job_id:
-        return
-    await get_mongo_database()["job_detail"].update_one(
-        {"_id": job_id},
-        {"$set": item},
-        upsert=True,
-    )
\ No newline at end of file
+    async def close(self) -> None:
+        await asyncio.gather(*(buffer.close() for buffer in self._buffers.values()))
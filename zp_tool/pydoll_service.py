@@ -27,7 +27,7 @@ from tenacity import (
 from yarl import URL
 
 from config import Config
-from zp_tool.items import Job
+from zp_tool.items import ACCEPTABILITY_FIELDS, Job
 from zp_tool.util import generate_text
 
 
@@ -299,7 +299,7 @@ class PydollService:
         await self.get_citys()
 
     async def get_citys(self) -> None:
-        if not Config.CITIES_PATH.exists():
+        if not Config.CITIES_PATH.exists() or not Config.CITY_TREE_PATH.exists():
             await self.tab.go_to(Config.CITY_API_URL)
             data = orjson.loads(await (await self.tab.find(tag_name="pre")).text)
             if data.get("message") == "Success":
@@ -309,19 +309,32 @@ class PydollService:
                     if city.get("name"):
                         mapping[city["name"]] = city["code"]
 
-                def extract_recursive(models) -> None:
+                def extract_recursive(models) -> list[dict]:
+                    nodes = []
                     if not models:
-                        return
+                        return nodes
                     for item in models:
-                        if item.get("name"):
-                            mapping[item["name"]] = item["code"]
-                        if item.get("subLevelModelList"):
-                            extract_recursive(item["subLevelModelList"])
-
-                extract_recursive(zp_data.get("cityList", []))
+                        if not item.get("name"):
+                            nodes.extend(
+                                extract_recursive(item.get("subLevelModelList")),
+                            )
+                            continue
+                        mapping[item["name"]] = item["code"]
+                        nodes.append({
+                            "name": item["name"],
+                            "code": item["code"],
+                            "children": extract_recursive(
+                                item.get("subLevelModelList"),
+                            ),
+                        })
+                    return nodes
+
+                tree = extract_recursive(zp_data.get("cityList", []))
+                orjson_opts = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
                 with Config.CITIES_PATH.open("wb") as f:
-                    orjson_opts = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
                     f.write(orjson.dumps(mapping, option=orjson_opts))
+                with Config.CITY_TREE_PATH.open("wb") as f:
+                    f.write(orjson.dumps(tree, option=orjson_opts))
             else:
                 sys.exit(1)
 
@@ -886,22 +899,19 @@ if (global.ABC) {{
         retry=retry_if_exception_type((ElementNotFound, TimeoutError)),
         reraise=True,
     )
-    async def greet(self, job_id: str) -> None:
+    async def greet(self, job_id: str, checked: bool = False) -> None:
         await self.tab.go_to(str(URL(Config.JOB_DETAIL_URL) / f"{job_id}.html"))
-        job = await Job.get_or_none(id=job_id)
-        if job is None:
-            job = Job(id=job_id)
-        if not await job.is_acceptable():
-            job.contacted = True
-            await job.save()
-            return
+        if not checked:
+            job = await Job.filter(id=job_id).only(*ACCEPTABILITY_FIELDS).first()
+            if not await (job or Job(id=job_id)).is_acceptable():
+                await Job.mark_contacted(job_id)
+                return
         element = await self.tab.query(
             ".btn.btn-more, .btn.btn-startchat, .error-content",
         )
         element_text = await element.text
         if any(word in element_text for word in ("继续", "更多", "页面不存在")):
-            job.contacted = True
-            await job.save()
+            await Job.mark_contacted(job_id)
             return
         if "异常" in element_text:
             raise ElementNotFound(element_text)
@@ -916,8 +926,7 @@ if (global.ABC) {{
         )
         if dialog and "已达上限" in (await dialog.text):
             sys.exit(0)
-        job.contacted = True
-        await job.save()
+        await Job.mark_contacted(job_id)
         element = await self.tab.query(".dialog-con, .chat-input")
         if "chat" in self.tab.url or ("发送" in (await element.text)):
             if "chat" not in self.tab.url and redirect_url:
@@ -0,0 +1,28 @@
+from collections.abc import Callable
+from typing import Any
+
+# Entry points of the DataSanitizer process pool. Spawned workers import
+# this module by name, so it does nothing at import time; DataSanitizer is
+# only loaded once a worker starts.
+
+
+def init_worker(keywords: frozenset[str], target_keys: frozenset[str]) -> None:
+    from .util import DataSanitizer
+
+    sanitizer = DataSanitizer()
+    sanitizer.KEYWORDS = keywords
+    sanitizer.TARGET_KEYS = target_keys
+
+
+def clean_chunk(
+    records: list[Any],
+    validate: Callable[[Any], bool] | None,
+) -> list[Any]:
+    from .util import DataSanitizer
+
+    sanitizer = DataSanitizer()
+    for record in records:
+        sanitizer.clean(record)
+    if validate is None:
+        return records
+    return [(record, validate(record)) for record in records]
@@ -0,0 +1,284 @@
+import copy
+import random
+import re
+import time
+from typing import Any
+
+from loguru import logger
+
+from .util import DataSanitizer
+
+# Alphabet for the parity corpus: the keywords' own characters, whole
+# keywords, and the neighbours the keep/delete rules look at.
+CORPUS_ALPHABET = [
+    *"来自BOSS直聘bossKANZHUNkanzhun中文字aZ9 \"'“”‘’​.,",
+    "BOSS直聘",
+    "来自boss直聘",
+    "直聘",
+    "boss",
+    "kanzhun",
+]
+SAMPLE_TEXT = "我们是一家互联网公司，来自BOSS直聘的岗位，负责后端开发boss直聘。" * 40
+# Keys for the nested corpus: the cleaned ones plus a few that are not.
+PAYLOAD_KEYS = [
+    "postDescription",
+    "jobName",
+    "brandName",
+    "bossName",
+    "labels",
+    "welfareList",
+    "encryptJobId",
+    "securityId",
+    "salaryDesc",
+    "jobInfo",
+    "bossInfo",
+    "brandComInfo",
+]
+
+
+class ReferenceSanitizer:
+    # The regex implementation _sanitize_text replaced, with the alternation
+    # ordered longest first so that overlapping keywords resolve the same way
+    # on every run. Kept only to check the automaton against.
+    def __init__(self, sanitizer: DataSanitizer) -> None:
+        self.sanitizer = sanitizer
+        self.pattern = re.compile(
+            "|".join(
+                map(re.escape, sorted(sanitizer.KEYWORDS, key=len, reverse=True)),
+            ),
+        )
+
+    def sanitize_text(self, text: str) -> str:
+        s = self.sanitizer
+        if not text or not isinstance(text, str):
+            return text
+
+        if text.strip().startswith(("http", "//")):
+            return text
+
+        text = s.INVISIBLE_REGEX.sub("", text)
+        original_valid = text
+        text_len = len(text)
+
+        matches = list(self.pattern.finditer(text))
+        if not matches:
+            return text
+
+        matches.sort(key=lambda x: len(x.group()), reverse=True)
+        active_matches = []
+        occupied: set[int] = set()
+
+        for m in matches:
+            start, end = m.start(), m.end()
+            if any(i in occupied for i in range(start, end)):
+                continue
+            active_matches.append(m)
+            occupied.update(range(start, end))
+
+        active_matches.sort(key=lambda x: x.start(), reverse=True)
+        temp_text = text
+
+        for m in active_matches:
+            start, end = m.start(), m.end()
+            word = m.group()
+
+            left = temp_text[start - 1] if start > 0 else ""
+            right = temp_text[end] if end < len(temp_text) else ""
+
+            should_delete = False
+
+            if (
+                s.ALPHANUM_CHECK.match(left)
+                or s.ALPHANUM_CHECK.match(right)
+                or left in s.QUOTE_CHARS
+                or right in s.QUOTE_CHARS
+            ):
+                should_delete = False
+
+            elif "来自" in word:
+                should_delete = True
+
+            elif start < 25 or end > (text_len - 25):
+                is_zh_left = s.ZH_CHECK.match(left)
+                is_zh_right = s.ZH_CHECK.match(right)
+                if "直聘" in word or is_zh_left or is_zh_right:
+                    should_delete = True
+
+            if should_delete:
+                temp_text = temp_text[:start] + temp_text[end:]
+
+        if len(temp_text.strip()) < 2 and len(original_valid.strip()) >= 2:
+            return original_valid
+
+        return temp_text
+
+    # The recursive clean() that the single iterative walk replaced: a
+    # _should_skip walk of each subtree before cleaning it.
+    def should_skip(self, data: Any) -> bool:
+        if isinstance(data, dict):
+            if data.get("brandName") == "BOSS直聘":
+                return True
+            return any(self.should_skip(v) for v in data.values())
+        if isinstance(data, list):
+            return any(self.should_skip(i) for i in data)
+        return False
+
+    def clean(self, data: Any) -> None:
+        if self.should_skip(data):
+            return
+
+        s = self.sanitizer
+        if isinstance(data, dict):
+            for k, v in data.items():
+                if isinstance(v, str) and k in s.TARGET_KEYS:
+                    data[k] = s._process_text(v)
+                elif isinstance(v, (dict, list)):
+                    self.clean(v)
+        elif isinstance(data, list):
+            for i, v in enumerate(data):
+                if isinstance(v, str):
+                    data[i] = s._process_text(v)
+                elif isinstance(v, (dict, list)):
+                    self.clean(v)
+
+
+def parity_corpus(size: int = 200_000, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(CORPUS_ALPHABET) for _ in range(rng.randint(0, 60)))
+        for _ in range(size)
+    ]
+
+
+def _payload(rng: random.Random, depth: int) -> Any:
+    roll = rng.random()
+    if depth <= 0 or roll < 0.4:
+        return "".join(rng.choice(CORPUS_ALPHABET) for _ in range(rng.randint(0, 30)))
+    if roll < 0.6:
+        return [_payload(rng, depth - 1) for _ in range(rng.randint(0, 4))]
+    node = {key: _payload(rng, depth - 1) for key in rng.sample(PAYLOAD_KEYS, 4)}
+    if rng.random() < 0.02:
+        node["brandName"] = "BOSS直聘"
+    return node
+
+
+def payload_corpus(size: int = 5_000, seed: int = 0) -> list[Any]:
+    rng = random.Random(seed)
+    return [_payload(rng, 6) for _ in range(size)]
+
+
+def detail_page(jobs: int = 30, seed: int = 0) -> dict[str, Any]:
+    # A jobList page of detail-shaped jobs, none of them skipped.
+    rng = random.Random(seed)
+    return {
+        "zpData": {
+            "jobList": [
+                {
+                    "jobInfo": {
+                        "jobName": "后端开发",
+                        "postDescription": SAMPLE_TEXT[: rng.randint(200, 800)],
+                        "labels": ["来自BOSS直聘", "五险一金", "boss直聘"],
+                    },
+                    "bossInfo": {"bossName": "张先生", "title": "来自boss直聘"},
+                    "brandComInfo": {
+                        "brandName": "某某科技",
+                        "introduce": SAMPLE_TEXT[:300],
+                        "welfareList": ["带薪年假", "BOSS直聘"],
+                    },
+                }
+                for _ in range(jobs)
+            ],
+        },
+    }
+
+
+def check_clean_parity(sanitizer: DataSanitizer, payloads: list[Any]) -> list[int]:
+    reference = ReferenceSanitizer(sanitizer)
+    mismatches = []
+    for i, payload in enumerate(payloads):
+        expected, actual = copy.deepcopy(payload), copy.deepcopy(payload)
+        reference.clean(expected)
+        sanitizer.clean(actual)
+        if expected != actual:
+            mismatches.append(i)
+    return mismatches
+
+
+def benchmark_clean(
+    sanitizer: DataSanitizer,
+    payload: Any,
+    rounds: int = 200,
+) -> dict[str, float]:
+    # Times the traversal alone: copies are made up front and both sides
+    # share the same _process_text.
+    reference = ReferenceSanitizer(sanitizer)
+    timings: dict[str, float] = {}
+    for name, clean in (
+        ("recursive", reference.clean),
+        ("iterative", sanitizer.clean),
+    ):
+        copies = [copy.deepcopy(payload) for _ in range(rounds)]
+        started = time.perf_counter()
+        for data in copies:
+            clean(data)
+        timings[f"{name}_ms_per_page"] = (
+            (time.perf_counter() - started) / rounds * 1e3
+        )
+    timings["speedup"] = timings["recursive_ms_per_page"] / max(
+        timings["iterative_ms_per_page"],
+        1e-9,
+    )
+    return timings
+
+
+def check_sanitizer_parity(
+    sanitizer: DataSanitizer,
+    corpus: list[str],
+) -> list[int]:
+    reference = ReferenceSanitizer(sanitizer)
+    return [
+        i
+        for i, text in enumerate(corpus)
+        if sanitizer._sanitize_text(text) != reference.sanitize_text(text)
+    ]
+
+
+def benchmark_sanitizer(
+    sanitizer: DataSanitizer,
+    text: str = SAMPLE_TEXT,
+    rounds: int = 2000,
+) -> dict[str, float]:
+    reference = ReferenceSanitizer(sanitizer)
+    kb = len(text.encode()) / 1024
+    timings: dict[str, float] = {}
+    for name, sanitize in (
+        ("regex", reference.sanitize_text),
+        ("automaton", sanitizer._sanitize_text),
+    ):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            sanitize(text)
+        elapsed = time.perf_counter() - started
+        timings[f"{name}_us_per_kb"] = elapsed / rounds / kb * 1e6
+    timings["speedup"] = timings["regex_us_per_kb"] / max(
+        timings["automaton_us_per_kb"],
+        1e-9,
+    )
+    return timings
+
+
+def bench_sanitizer(size: int = 200_000, seed: int = 0) -> None:
+    sanitizer = DataSanitizer()
+    corpus = parity_corpus(size, seed)
+    mismatches = check_sanitizer_parity(sanitizer, corpus)
+    logger.info(f"Sanitizer parity mismatches: {len(mismatches)}/{len(corpus)}")
+    for i in mismatches[:10]:
+        logger.warning(f"Parity mismatch on {corpus[i]!r}")
+    logger.info(f"Sanitizer timings: {benchmark_sanitizer(sanitizer)}")
+
+    payloads = payload_corpus(seed=seed)
+    mismatches = check_clean_parity(sanitizer, payloads)
+    logger.info(f"clean() parity mismatches: {len(mismatches)}/{len(payloads)}")
+    for i in mismatches[:10]:
+        logger.warning(f"clean() mismatch on {payloads[i]!r}")
+    logger.info(f"clean() timings: {benchmark_clean(sanitizer, detail_page())}")
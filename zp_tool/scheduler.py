@@ -0,0 +1,66 @@
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+
+class QueryScheduler:
+    # Tracks per (city, query, salary) yield, the share of list cards that
+    # still needed a detail fetch, and revisits a combination after an
+    # interval that grows as its yield drops.
+    ALPHA = 0.3
+
+    def __init__(
+        self,
+        path: Path,
+        min_interval: float,
+        max_interval: float,
+    ) -> None:
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._stats: dict[str, dict[str, float]] = {}
+        self.load()
+
+    @staticmethod
+    def key(city: Any, query: str, salary: str) -> str:
+        return f"{city}|{query}|{salary}"
+
+    def load(self) -> None:
+        try:
+            self._stats = orjson.loads(self.path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            self._stats = {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(orjson.dumps(self._stats))
+        os.replace(tmp, self.path)
+
+    def record(self, key: str, total: int, new: int) -> None:
+        # An empty page counts as zero yield, so it backs off like any other.
+        observed = new / total if total else 0.0
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"yield": observed, "visits": 0}
+        else:
+            stats["yield"] += self.ALPHA * (observed - stats["yield"])
+        stats["visits"] += 1
+        stats["last_visit"] = time.time()
+
+    def interval(self, key: str) -> float:
+        stats = self._stats.get(key)
+        if stats is None:
+            return 0.0
+        floor = self.min_interval / self.max_interval
+        return min(self.max_interval, self.min_interval / max(stats["yield"], floor))
+
+    def is_due(self, key: str, now: float | None = None) -> bool:
+        stats = self._stats.get(key)
+        if stats is None or "last_visit" not in stats:
+            return True
+        now = time.time() if now is None else now
+        return now - stats["last_visit"] >= self.interval(key)
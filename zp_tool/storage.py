@@ -0,0 +1,226 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+import orjson
+from loguru import logger
+
+from config import Config
+
+from .mongodb import MongoDocumentStore, fingerprint
+
+COLLECTIONS = ("job", "job_detail")
+
+
+class DocumentStore(Protocol):
+    async def upsert(self, collection: str, key: Any, doc: dict) -> None: ...
+
+    async def upsert_many(self, collection: str, docs: dict[Any, dict]) -> set[Any]: ...
+
+    async def put_many(self, collection: str, docs: dict[Any, dict]) -> None: ...
+
+    async def get(self, collection: str, key: Any) -> dict | None: ...
+
+    async def close(self) -> None: ...
+
+
+class SQLiteDocumentStore:
+    # Embedded store for nodes without Mongo. Rows keep a synced flag so that
+    # they can be shipped upstream in bulk later (see ship_upstream).
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.written = 0
+        self.unchanged = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for collection in COLLECTIONS:
+                self._conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {collection} (
+                        id TEXT PRIMARY KEY,
+                        hash TEXT NOT NULL,
+                        body BLOB NOT NULL,
+                        updated_at REAL NOT NULL,
+                        synced INTEGER NOT NULL DEFAULT 0
+                    )
+                    """,
+                )
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{collection}_synced "
+                    f"ON {collection} (synced)",
+                )
+            self._conn.commit()
+
+    def _upsert(
+        self,
+        collection: str,
+        rows: list[tuple[str, str, bytes, float]],
+    ) -> int:
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"""
+                INSERT INTO {collection} (id, hash, body, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    hash = excluded.hash,
+                    body = excluded.body,
+                    updated_at = excluded.updated_at,
+                    synced = 0
+                WHERE {collection}.hash != excluded.hash
+                """,
+                rows,
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    async def upsert_many(self, collection: str, docs: dict[Any, dict]) -> set[Any]:
+        now = time.time()
+        rows = [
+            (
+                str(key),
+                fingerprint(doc),
+                orjson.dumps(doc, default=str),
+                now,
+            )
+            for key, doc in docs.items()
+        ]
+        changed = await asyncio.to_thread(self._upsert, collection, rows)
+        self.written += changed
+        self.unchanged += len(rows) - changed
+        return set()
+
+    async def upsert(self, collection: str, key: Any, doc: dict) -> None:
+        await self.upsert_many(collection, {key: doc})
+
+    async def put_many(self, collection: str, docs: dict[Any, dict]) -> None:
+        # Local writes are cheap enough to batch straight through.
+        await self.upsert_many(collection, docs)
+
+    def _get(self, collection: str, key: Any) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT body FROM {collection} WHERE id = ?",
+                (str(key),),
+            ).fetchone()
+        return row[0] if row else None
+
+    async def get(self, collection: str, key: Any) -> dict | None:
+        body = await asyncio.to_thread(self._get, collection, key)
+        return orjson.loads(body) if body is not None else None
+
+    def _unsynced(
+        self,
+        collection: str,
+        after: str,
+        limit: int,
+    ) -> list[tuple[str, str, bytes]]:
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT id, hash, body FROM {collection} "
+                "WHERE synced = 0 AND id > ? ORDER BY id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+
+    def _mark_synced(self, collection: str, hashes: dict[str, str]) -> None:
+        # Matching on the hash too leaves a row the crawler rewrote after it
+        # was read unsynced, so the new body is shipped on the next pass.
+        with self._lock:
+            self._conn.executemany(
+                f"UPDATE {collection} SET synced = 1 WHERE id = ? AND hash = ?",
+                list(hashes.items()),
+            )
+            self._conn.commit()
+
+    async def unsynced(
+        self,
+        collection: str,
+        after: str,
+        limit: int,
+    ) -> dict[str, tuple[str, dict]]:
+        rows = await asyncio.to_thread(self._unsynced, collection, after, limit)
+        return {key: (digest, orjson.loads(body)) for key, digest, body in rows}
+
+    async def mark_synced(self, collection: str, hashes: dict[str, str]) -> None:
+        await asyncio.to_thread(self._mark_synced, collection, hashes)
+
+    async def close(self) -> None:
+        logger.info(
+            f"Local store writes: written={self.written} unchanged={self.unchanged}",
+        )
+        with self._lock:
+            self._conn.close()
+
+
+_STORE: DocumentStore | None = None
+
+
+def get_document_store() -> DocumentStore:
+    global _STORE
+    if _STORE is None:
+        if Config.cfg.storage == "local":
+            _STORE = SQLiteDocumentStore(Config.LOCAL_STORE_PATH)
+        else:
+            _STORE = MongoDocumentStore()
+    return _STORE
+
+
+async def close_document_store() -> None:
+    global _STORE
+    if _STORE is not None:
+        await _STORE.close()
+        _STORE = None
+
+
+async def insert_jobs(items: list) -> None:
+    docs = {
+        item["encryptJobId"]: item
+        for item in items
+        if isinstance(item, dict) and item.get("encryptJobId")
+    }
+    if docs:
+        await get_document_store().put_many("job", docs)
+
+
+async def insert_job_detail(item) -> None:
+    if not isinstance(item, dict):
+        return
+    job_id = item.get("jobInfo", {}).get("encryptId")
+    if not job_id:
+        return
+    await get_document_store().upsert("job_detail", job_id, item)
+
+
+async def ship_upstream(batch_size: int = 500) -> None:
+    local = SQLiteDocumentStore(Config.LOCAL_STORE_PATH)
+    remote = MongoDocumentStore()
+    try:
+        for collection in COLLECTIONS:
+            shipped = 0
+            cursor = ""
+            while rows := await local.unsynced(collection, cursor, batch_size):
+                cursor = max(rows)
+                failed = await remote.upsert_many(
+                    collection,
+                    {key: doc for key, (_, doc) in rows.items()},
+                )
+                await local.mark_synced(
+                    collection,
+                    {
+                        key: digest
+                        for key, (digest, _) in rows.items()
+                        if key not in failed
+                    },
+                )
+                shipped += len(rows) - len(failed)
+            logger.info(f"Shipped {shipped} {collection} documents upstream")
+    finally:
+        await remote.close()
+        await local.close()
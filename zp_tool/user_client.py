@@ -10,11 +10,18 @@ from tenacity import (
     stop_after_attempt,
     wait_exponential,
 )
-from tortoise import Tortoise
 
 from config import Config
 
-from .items import Job, MaskCompany, init_db
+from .bloom import add_resolved
+from .items import (
+    ACCEPTABILITY_FIELDS,
+    Job,
+    MaskCompany,
+    blocklist_index,
+    close_db,
+    init_db,
+)
 from .pydoll_service import PydollService
 
 
@@ -27,9 +34,20 @@ class UserClient:
 
     async def greet(self) -> None:
         await init_db()
-        ids = await Job.get_contactable_ids()
-        for job_id in ids:
-            await self.pydoll_service.greet(job_id)
+        await Job.init_resolved_filter()
+        try:
+            async for ids in Job.stream_contactable_ids(
+                Config.GREET_PAGE_SIZE,
+                Config.cfg.greet_order,
+            ):
+                jobs = await Job.filter(id__in=ids).only(*ACCEPTABILITY_FIELDS)
+                verdicts = await Job.evaluate_acceptability(jobs)
+                for job_id in ids:
+                    if verdicts.get(job_id):
+                        await self.pydoll_service.greet(job_id, checked=True)
+        finally:
+            Job.save_resolved_filter()
+            await close_db()
 
     @retry(
         stop=stop_after_attempt(3),
@@ -63,6 +81,10 @@ class UserClient:
                             "encrypt_com_id": data["encryptComId"],
                         },
                     )
+                    blocklist_index.add_mask_company(
+                        data["comId"],
+                        data.get("comName"),
+                    )
 
             if not result.get("zpData", {}).get("hasMore", False):
                 logger.info("No more pages.")
@@ -79,7 +101,6 @@ class UserClient:
     )
     async def save_relation(self, group="interaction", repo_path=None) -> None:
         await init_db()
-        conn = await Tortoise.get_connection("default")
 
         page = 1
         while True:
@@ -97,16 +118,15 @@ class UserClient:
             if not datas:
                 break
 
-            async with conn.transaction():
-                values_list = [[d.get("encryptJobId"), True] for d in datas]
-                if values_list:
-                    sql = """
-                    INSERT INTO zp_item (id, contacted)
-                    VALUES (%s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        contacted = VALUES(contacted)
-                    """
-                    await conn.execute_query(sql, values_list)
+            job_ids = {d.get("encryptJobId") for d in datas} - {None}
+            if job_ids:
+                await Job.bulk_create(
+                    [Job(id=job_id, contacted=True) for job_id in job_ids],
+                    on_conflict=["id"],
+                    update_fields=["contacted"],
+                )
+                for job_id in job_ids:
+                    add_resolved(job_id)
 
             for data in datas:
                 if repo_path:
@@ -1,8 +1,18 @@
+import asyncio
+import copy
+import itertools
+import multiprocessing
 import os
 import re
 import sys
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import Any
 
+import ahocorasick
 import cashews
 import orjson
 from google import genai
@@ -11,55 +21,185 @@ from loguru import logger
 
 from config import Config
 
+from .sanitize_worker import clean_chunk, init_worker
+
 
 class CityUtils:
+    _stamp: tuple[int, int] | None = None
+    _name_to_code: dict[str, Any] = {}
+    _code_to_name: dict[Any, str] = {}
+    _parent: dict[Any, Any] = {}
+    _children: dict[Any, tuple[Any, ...]] = {}
+
     @classmethod
-    def get_citys(cls) -> dict[str, str]:
+    def _load_json(cls, path: Path) -> Any:
         try:
-            with Config.CITIES_PATH.open("rb") as f:
+            with path.open("rb") as f:
                 content = f.read()
                 if not content:
                     msg = "City file is empty"
                     raise ValueError(msg)
                 return orjson.loads(content)
         except (orjson.JSONDecodeError, ValueError):
-            Config.CITIES_PATH.unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
             sys.exit(1)
 
+    @classmethod
+    def _ensure_index(cls) -> None:
+        tree_mtime = (
+            Config.CITY_TREE_PATH.stat().st_mtime_ns
+            if Config.CITY_TREE_PATH.exists()
+            else 0
+        )
+        stamp = (Config.CITIES_PATH.stat().st_mtime_ns, tree_mtime)
+        if stamp == cls._stamp:
+            return
+
+        name_to_code = dict(cls._load_json(Config.CITIES_PATH))
+        code_to_name = {code: name for name, code in name_to_code.items()}
+        parent: dict[Any, Any] = {}
+        children: dict[Any, list[Any]] = {}
+
+        tree = cls._load_json(Config.CITY_TREE_PATH) if tree_mtime else []
+        stack = [(node, None) for node in reversed(tree)]
+        while stack:
+            node, parent_code = stack.pop()
+            code = node["code"]
+            code_to_name[code] = node["name"]
+            name_to_code.setdefault(node["name"], code)
+            parent[code] = parent_code
+            if parent_code is not None:
+                children.setdefault(parent_code, []).append(code)
+            stack.extend(
+                (child, code) for child in reversed(node.get("children", ()))
+            )
+
+        cls._name_to_code = name_to_code
+        cls._code_to_name = code_to_name
+        cls._parent = parent
+        cls._children = {code: tuple(codes) for code, codes in children.items()}
+        cls._stamp = stamp
+
+    @classmethod
+    def get_citys(cls) -> dict[str, str]:
+        cls._ensure_index()
+        return cls._name_to_code
+
     @classmethod
     def get_city_code_by_name(cls, city_name: str) -> str | None:
         return cls.get_citys().get(city_name)
 
+    @classmethod
+    def get_city_name_by_code(cls, code: Any) -> str | None:
+        cls._ensure_index()
+        return cls._code_to_name.get(code)
+
+    @classmethod
+    def get_parent_code(cls, code: Any) -> Any:
+        cls._ensure_index()
+        return cls._parent.get(code)
+
+    @classmethod
+    def get_child_codes(cls, code: Any) -> tuple[Any, ...]:
+        cls._ensure_index()
+        return cls._children.get(code, ())
+
+    @classmethod
+    def expand_city_codes(cls, name: str) -> tuple[Any, ...]:
+        # A province expands to its cities; a city or district is itself.
+        code = cls.get_city_code_by_name(name)
+        if code is None:
+            return ()
+        if cls._parent.get(code) is None and code in cls._children:
+            return cls._children[code]
+        return (code,)
+
+
+class JobCard:
+    # The list-card fields job_to_job_detail needs. Queued detail requests
+    # carry it packed as a positional list rather than the whole card dict,
+    # led by PACK_VERSION; bump it whenever the fields below change, since
+    # the request queue persists packs written by older code.
+    PACK_VERSION = 1
+    __slots__ = (
+        "encryptJobId",
+        "securityId",
+        "lid",
+        "jobName",
+        "salaryDesc",
+        "jobExperience",
+        "jobDegree",
+        "cityName",
+        "postDescription",
+        "longitude",
+        "latitude",
+        "encryptBossId",
+        "bossName",
+        "bossTitle",
+        "activeTimeDesc",
+        "encryptBrandId",
+        "brandName",
+        "brandScaleName",
+        "brandIndustry",
+        "contact",
+    )
+
+    def __init__(self, *values: Any) -> None:
+        for name, value in itertools.zip_longest(self.__slots__, values):
+            setattr(self, name, value)
 
-def job_to_job_detail(job: dict) -> dict:
+    @classmethod
+    def from_job(cls, job: dict) -> "JobCard":
+        gps = job.get("gps") or {}
+        return cls(*(
+            gps.get(name) if name in {"longitude", "latitude"} else job.get(name)
+            for name in cls.__slots__
+        ))
+
+    def pack(self) -> list[Any]:
+        values = [getattr(self, name) for name in self.__slots__]
+        while values and values[-1] is None:
+            values.pop()
+        return [self.PACK_VERSION, *values]
+
+    @classmethod
+    def unpack(cls, packed: list[Any]) -> "JobCard":
+        version, *values = packed or [None]
+        if version != cls.PACK_VERSION:
+            msg = f"Unsupported JobCard pack version {version!r}"
+            raise ValueError(msg)
+        return cls(*values)
+
+
+def job_to_job_detail(job: JobCard) -> dict:
     return {
-        "securityId": job.get("securityId"),
-        "lid": job.get("lid"),
+        "securityId": job.securityId,
+        "lid": job.lid,
         "jobInfo": {
-            "encryptId": job.get("encryptJobId"),
-            "salaryDesc": job.get("salaryDesc"),
-            "jobName": job.get("jobName"),
-            "experienceName": job.get("jobExperience"),
-            "degreeName": job.get("jobDegree"),
-            "encryptUserId": job.get("encryptBossId"),
-            "locationName": job.get("cityName"),
-            "postDescription": job.get("postDescription"),
-            "longitude": (job.get("gps") or {}).get("longitude"),
-            "latitude": (job.get("gps") or {}).get("latitude"),
+            "encryptId": job.encryptJobId,
+            "salaryDesc": job.salaryDesc,
+            "jobName": job.jobName,
+            "experienceName": job.jobExperience,
+            "degreeName": job.jobDegree,
+            "encryptUserId": job.encryptBossId,
+            "locationName": job.cityName,
+            "postDescription": job.postDescription,
+            "longitude": job.longitude,
+            "latitude": job.latitude,
         },
         "bossInfo": {
-            "name": job.get("bossName"),
-            "title": job.get("bossTitle"),
-            "activeTimeDesc": job.get("activeTimeDesc"),
+            "name": job.bossName,
+            "title": job.bossTitle,
+            "activeTimeDesc": job.activeTimeDesc,
         },
         "brandComInfo": {
-            "encryptBrandId": job.get("encryptBrandId"),
-            "brandName": job.get("brandName"),
-            "scaleName": job.get("brandScaleName"),
-            "industryName": job.get("brandIndustry"),
+            "encryptBrandId": job.encryptBrandId,
+            "brandName": job.brandName,
+            "scaleName": job.brandScaleName,
+            "industryName": job.brandIndustry,
         },
         "atsOnlineApplyInfo": {
-            "alreadyApply": job.get("contact"),
+            "alreadyApply": job.contact,
         },
     }
 
@@ -96,6 +236,60 @@ def generate_text(contents: str) -> str:
     return re.sub(r"\s+", " ", response.text).strip()
 
 
+class TextCache:
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: str) -> None:
+        size = sys.getsizeof(key) + (0 if value is key else sys.getsizeof(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
 class DataSanitizer:
     _instance: "DataSanitizer | None" = None
 
@@ -108,7 +302,12 @@ class DataSanitizer:
         if hasattr(self, "_initialized"):
             return
 
-        self.TARGET_KEYS: frozenset[str] = frozenset({
+        self._cache: TextCache | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_workers = 0
+        self._pool_rules: tuple[frozenset[str], frozenset[str]] | None = None
+
+        self.TARGET_KEYS = frozenset({
             "postDescription",
             "introduce",
             "skills",
@@ -124,7 +323,7 @@ class DataSanitizer:
             "title",
         })
 
-        self.KEYWORDS: frozenset[str] = frozenset({
+        self.KEYWORDS = frozenset({
             "来自BOSS直聘",
             "来自boss直聘",
             "来自Boss直聘",
@@ -138,23 +337,79 @@ class DataSanitizer:
             "boss",
         })
 
-        self.SCAN_PATTERN = re.compile("|".join(map(re.escape, self.KEYWORDS)))
         self.INVISIBLE_REGEX = re.compile(r"[\u200b-\u200f\uFEFF\u0000]")
         self.ZH_CHECK = re.compile(r"[\u4e00-\u9fa5]")
         self.ALPHANUM_CHECK = re.compile(r"[a-zA-Z0-9]")
         self.QUOTE_CHARS = frozenset({'"', "'", "“", "”", "‘", "’"})
         self._initialized = True
 
-    def _should_skip(self, data: Any) -> bool:
-        if isinstance(data, dict):
-            if data.get("brandName") == "BOSS直聘":
-                return True
-            return any(self._should_skip(v) for v in data.values())
-        if isinstance(data, list):
-            return any(self._should_skip(i) for i in data)
-        return False
+    @property
+    def TARGET_KEYS(self) -> frozenset[str]:
+        return self._target_keys
+
+    @TARGET_KEYS.setter
+    def TARGET_KEYS(self, value: frozenset[str]) -> None:
+        self._target_keys = frozenset(value)
+        self.clear_cache()
+
+    @property
+    def KEYWORDS(self) -> frozenset[str]:
+        return self._keywords
+
+    @KEYWORDS.setter
+    def KEYWORDS(self, value: frozenset[str]) -> None:
+        self._keywords = frozenset(value)
+        self.MATCHER = self._build_matcher(self._keywords)
+        self.clear_cache()
+
+    def enable_cache(
+        self,
+        max_entries: int = 100_000,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self._cache = TextCache(max_entries, max_bytes)
+
+    def disable_cache(self) -> None:
+        self._cache = None
+
+    def clear_cache(self) -> None:
+        if self._cache is not None:
+            self._cache.clear()
+
+    def cache_stats(self) -> dict[str, int | float] | None:
+        return self._cache.stats() if self._cache is not None else None
+
+    @staticmethod
+    def _build_matcher(keywords: frozenset[str]) -> ahocorasick.Automaton:
+        automaton = ahocorasick.Automaton()
+        for word in keywords:
+            automaton.add_word(word, (len(word), "来自" in word, "直聘" in word))
+        automaton.make_automaton()
+        return automaton
+
+    def _iter_matches(self, text: str) -> list[tuple[int, int, bool, bool]]:
+        if not len(self.MATCHER):
+            return []
+        # iter_long drops a pending shorter match when the input ends inside a
+        # longer keyword, so scan past a NUL that INVISIBLE_REGEX already strips.
+        matches = []
+        for end, (length, has_from, has_zhipin) in self.MATCHER.iter_long(
+            text + "\0",
+        ):
+            matches.append((end + 1 - length, end + 1, has_from, has_zhipin))
+        return matches
 
     def _process_text(self, text: str) -> str:
+        cache = self._cache
+        if cache is None or not text or not isinstance(text, str):
+            return self._sanitize_text(text)
+        result = cache.get(text)
+        if result is None:
+            result = self._sanitize_text(text)
+            cache.put(text, result)
+        return result
+
+    def _sanitize_text(self, text: str) -> str:
         if not text or not isinstance(text, str):
             return text
 
@@ -162,33 +417,23 @@ class DataSanitizer:
             return text
 
         text = self.INVISIBLE_REGEX.sub("", text)
-        original_valid = text
         text_len = len(text)
 
-        matches = list(self.SCAN_PATTERN.finditer(text))
+        matches = self._iter_matches(text)
         if not matches:
             return text
 
-        matches.sort(key=lambda x: len(x.group()), reverse=True)
-        active_matches = []
-        occupied: set[int] = set()
-
-        for m in matches:
-            s, e = m.start(), m.end()
-            if any(i in occupied for i in range(s, e)):
-                continue
-            active_matches.append(m)
-            occupied.update(range(s, e))
-
-        active_matches.sort(key=lambda x: x.start(), reverse=True)
-        temp_text = text
+        # Matches are resolved right to left so that the right-hand neighbour
+        # is the one left behind by any deletion directly after the match.
+        deleted: list[tuple[int, int]] = []
+        right = ""
+        next_start = -1
+        next_deleted = False
 
-        for m in active_matches:
-            s, e = m.start(), m.end()
-            word = m.group()
-
-            left = temp_text[s - 1] if s > 0 else ""
-            right = temp_text[e] if e < len(temp_text) else ""
+        for s, e, has_from, has_zhipin in reversed(matches):
+            if not (next_deleted and e == next_start):
+                right = text[e] if e < text_len else ""
+            left = text[s - 1] if s > 0 else ""
 
             should_delete = False
 
@@ -200,39 +445,128 @@ class DataSanitizer:
             ):
                 should_delete = False
 
-            elif "来自" in word:
+            elif has_from:
                 should_delete = True
 
             elif s < 25 or e > (text_len - 25):
                 is_zh_left = self.ZH_CHECK.match(left)
                 is_zh_right = self.ZH_CHECK.match(right)
-                if "直聘" in word or is_zh_left or is_zh_right:
+                if has_zhipin or is_zh_left or is_zh_right:
                     should_delete = True
 
             if should_delete:
-                temp_text = temp_text[:s] + temp_text[e:]
+                deleted.append((s, e))
+            next_start, next_deleted = s, should_delete
 
-        if len(temp_text.strip()) < 2 and len(original_valid.strip()) >= 2:
-            return original_valid
+        if not deleted:
+            return text
 
-        return temp_text
+        parts = []
+        pos = 0
+        for s, e in reversed(deleted):
+            parts.append(text[pos:s])
+            pos = e
+        parts.append(text[pos:])
+        result = "".join(parts)
+
+        if len(result.strip()) < 2 and len(text.strip()) >= 2:
+            return text
+
+        return result
 
     def clean(self, data: Any) -> None:
-        if self._should_skip(data):
+        # One iterative walk: strings are collected rather than rewritten so
+        # that a BOSS直聘 brand anywhere in the tree still leaves it untouched.
+        pending: list[tuple[dict | list, Any, str]] = []
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if node.get("brandName") == "BOSS直聘":
+                    return
+                for k, v in node.items():
+                    if isinstance(v, str):
+                        if k in self.TARGET_KEYS:
+                            pending.append((node, k, v))
+                    elif isinstance(v, (dict, list)):
+                        stack.append(v)
+            elif isinstance(node, list):
+                for i, v in enumerate(node):
+                    if isinstance(v, str):
+                        pending.append((node, i, v))
+                    elif isinstance(v, (dict, list)):
+                        stack.append(v)
+
+        for container, key, value in pending:
+            container[key] = self._process_text(value)
+
+    def _get_pool(self, workers: int | None) -> ProcessPoolExecutor:
+        # Workers get the rules once, at start-up, so a pool started before a
+        # KEYWORDS / TARGET_KEYS change is replaced rather than reused.
+        workers = workers or os.cpu_count() or 1
+        rules = (self.KEYWORDS, self.TARGET_KEYS)
+        if (
+            self._pool is None
+            or self._pool_workers != workers
+            or self._pool_rules != rules
+        ):
+            # Not waited for: this can run on the event loop via clean_async.
+            # Chunks already submitted finish on the old workers.
+            self.shutdown_pool(wait=False)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=rules,
+            )
+            self._pool_workers = workers
+            self._pool_rules = rules
+        return self._pool
+
+    def shutdown_pool(self, *, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=wait)
+            self._pool = None
+            self._pool_workers = 0
+            self._pool_rules = None
+
+    def clean_many(
+        self,
+        records: Iterable[Any],
+        workers: int | None = None,
+        chunk_size: int = 256,
+        validate: Callable[[Any], bool] | None = None,
+    ) -> Iterator[Any]:
+        # Yields cleaned copies in input order, or (record, accepted) pairs when
+        # validate is given. validate runs in the workers, so it must be a
+        # module-level function. At most two chunks per worker are in flight.
+        if workers == 1:
+            for record in records:
+                yield from clean_chunk([copy.deepcopy(record)], validate)
             return
 
-        if isinstance(data, dict):
-            for k, v in data.items():
-                if isinstance(v, str) and k in self.TARGET_KEYS:
-                    data[k] = self._process_text(v)
-                elif isinstance(v, (dict, list)):
-                    self.clean(v)
-        elif isinstance(data, list):
-            for i, v in enumerate(data):
-                if isinstance(v, str):
-                    data[i] = self._process_text(v)
-                elif isinstance(v, (dict, list)):
-                    self.clean(v)
+        pool = self._get_pool(workers)
+        pending: deque = deque()
+        for chunk in itertools.batched(records, chunk_size):
+            pending.append(pool.submit(clean_chunk, list(chunk), validate))
+            if len(pending) >= self._pool_workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    async def clean_async(
+        self,
+        records: list[Any],
+        workers: int | None = None,
+        validate: Callable[[Any], bool] | None = None,
+    ) -> list[Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(workers),
+            clean_chunk,
+            records,
+            validate,
+        )
 
 
 def is_mainly_chinese(text: str, threshold: float = 0.5) -> bool:
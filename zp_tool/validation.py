@@ -0,0 +1,320 @@
+import re
+import time
+from collections.abc import Callable, Iterable, Mapping, Sequence, Sized
+from typing import Any
+
+from loguru import logger
+
+Check = Callable[[Any], bool]
+
+# Rules the compiler understands; anything else (normalization, custom
+# rules, dependencies, ...) makes the whole validator fall back to Cerberus.
+SUPPORTED_RULES = frozenset({
+    "allow_unknown",
+    "allowed",
+    "empty",
+    "forbidden",
+    "max",
+    "maxlength",
+    "meta",
+    "min",
+    "minlength",
+    "nullable",
+    "regex",
+    "require_all",
+    "required",
+    "schema",
+    "type",
+})
+
+
+class Unsupported(Exception):
+    pass
+
+
+class _Fallback(Exception):
+    pass
+
+
+def _compile_type(data_type: Any, types_mapping: Mapping[str, Any]) -> Check | None:
+    if not data_type:
+        return None
+    names = (data_type,) if isinstance(data_type, str) else tuple(data_type)
+    try:
+        definitions = [types_mapping[name] for name in names]
+    except KeyError as e:
+        msg = f"custom type {e}"
+        raise Unsupported(msg) from None
+    pairs = [(d.included_types, d.excluded_types) for d in definitions]
+
+    def check(value: Any) -> bool:
+        return any(
+            isinstance(value, included) and not isinstance(value, excluded)
+            for included, excluded in pairs
+        )
+
+    return check
+
+
+def _compile_value_rules(rules: Mapping[str, Any]) -> tuple[list[Check], list[Check]]:
+    # Returns (checks skipped for empty values, checks that always run),
+    # mirroring which rules Cerberus drops once `empty` has matched.
+    droppable: list[Check] = []
+    always: list[Check] = []
+    if "allowed" in rules:
+        allowed = rules["allowed"]
+
+        def check_allowed(value: Any) -> bool:
+            if isinstance(value, Iterable) and not isinstance(value, str):
+                return all(x in allowed for x in value)
+            return value in allowed
+
+        droppable.append(check_allowed)
+    if "forbidden" in rules:
+        forbidden = rules["forbidden"]
+
+        def check_forbidden(value: Any) -> bool:
+            if isinstance(value, Sequence) and not isinstance(value, str):
+                return not set(value) & set(forbidden)
+            return value not in forbidden
+
+        droppable.append(check_forbidden)
+    if "minlength" in rules:
+        min_length = rules["minlength"]
+        droppable.append(
+            lambda value: not (isinstance(value, Iterable) and len(value) < min_length),
+        )
+    if "maxlength" in rules:
+        max_length = rules["maxlength"]
+        droppable.append(
+            lambda value: not (isinstance(value, Iterable) and len(value) > max_length),
+        )
+    if "regex" in rules:
+        pattern = rules["regex"]
+        match = re.compile(pattern if pattern.endswith("$") else pattern + "$").match
+        droppable.append(lambda value: not isinstance(value, str) or bool(match(value)))
+    if "min" in rules:
+        min_value = rules["min"]
+
+        def check_min(value: Any) -> bool:
+            try:
+                return not value < min_value
+            except TypeError:
+                return True
+
+        always.append(check_min)
+    if "max" in rules:
+        max_value = rules["max"]
+
+        def check_max(value: Any) -> bool:
+            try:
+                return not value > max_value
+            except TypeError:
+                return True
+
+        always.append(check_max)
+    return droppable, always
+
+
+def _compile_rules(
+    rules: Any,
+    config: dict[str, Any],
+) -> Check:
+    if not isinstance(rules, Mapping):
+        msg = f"rules set {rules!r}"
+        raise Unsupported(msg)
+    if unknown := set(rules) - SUPPORTED_RULES:
+        msg = f"rules {sorted(unknown)}"
+        raise Unsupported(msg)
+
+    nullable = rules.get("nullable", False)
+    type_check = _compile_type(rules.get("type"), config["types_mapping"])
+    empty = rules.get("empty")
+    droppable, always = _compile_value_rules(rules)
+    if "schema" in rules:
+        always.append(_compile_subschema(rules, config))
+    checks = droppable + always
+
+    def check(value: Any) -> bool:
+        if value is None:
+            return nullable
+        if type_check is not None and not type_check(value):
+            return False
+        if empty is not None and isinstance(value, Sized) and len(value) == 0:
+            return bool(empty) and all(c(value) for c in always)
+        return all(c(value) for c in checks)
+
+    return check
+
+
+def _compile_subschema(rules: Mapping[str, Any], config: dict[str, Any]) -> Check:
+    # Cerberus picks the meaning of `schema` from the value at hand: a
+    # mapping is checked against a sub-schema, a sequence item by item.
+    schema = rules["schema"]
+    mapping_check: Check | None = None
+    items_check: Check | None = None
+    try:
+        mapping_check = _compile_mapping(
+            schema,
+            {
+                **config,
+                "allow_unknown": rules.get("allow_unknown", config["allow_unknown"]),
+                "require_all": rules.get("require_all", config["require_all"]),
+            },
+        )
+    except Unsupported:
+        pass
+    try:
+        items_check = _compile_rules(schema, config)
+    except Unsupported:
+        pass
+    if mapping_check is None and items_check is None:
+        msg = f"schema {schema!r}"
+        raise Unsupported(msg)
+    ignore_none = config["ignore_none_values"]
+
+    def check(value: Any) -> bool:
+        if isinstance(value, Sequence) and not isinstance(value, str):
+            if items_check is None:
+                raise _Fallback
+            return all(
+                items_check(item)
+                for item in value
+                if not (ignore_none and item is None)
+            )
+        if isinstance(value, Mapping):
+            if mapping_check is None:
+                raise _Fallback
+            return mapping_check(value)
+        return True
+
+    return check
+
+
+def _compile_mapping(schema: Any, config: dict[str, Any]) -> Check:
+    if not isinstance(schema, Mapping):
+        msg = f"schema {schema!r}"
+        raise Unsupported(msg)
+    allow_unknown = config["allow_unknown"]
+    if not isinstance(allow_unknown, bool):
+        msg = "allow_unknown schema"
+        raise Unsupported(msg)
+    require_all = config["require_all"]
+    ignore_none = config["ignore_none_values"]
+    checks = {field: _compile_rules(rules, config) for field, rules in schema.items()}
+    required = tuple(
+        field
+        for field, rules in schema.items()
+        if rules.get("required", require_all) is True
+    )
+
+    def check(document: Mapping[str, Any]) -> bool:
+        for field, value in document.items():
+            if ignore_none and value is None:
+                continue
+            field_check = checks.get(field)
+            if field_check is None:
+                if not allow_unknown:
+                    return False
+            elif not field_check(value):
+                return False
+        if ignore_none:
+            return all(document.get(field) is not None for field in required)
+        return all(field in document for field in required)
+
+    return check
+
+
+class CompiledValidator:
+    # Plain-closure version of a Cerberus validator for the pass/fail
+    # answer. Cerberus itself only runs to explain a rejection (errors) or
+    # when the schema uses rules the compiler does not cover.
+    def __init__(self, validator: Any) -> None:
+        self.validator = validator
+        self._last: Any = None
+        self._last_ok = True
+        self._check: Check | None = None
+        try:
+            if validator.schema is None or validator.purge_unknown:
+                msg = "schema-less or purging validator"
+                raise Unsupported(msg)
+            if getattr(validator, "purge_readonly", False):
+                msg = "purge_readonly"
+                raise Unsupported(msg)
+            self._check = _compile_mapping(
+                validator.schema,
+                {
+                    "allow_unknown": validator.allow_unknown,
+                    "require_all": validator.require_all,
+                    "ignore_none_values": validator.ignore_none_values,
+                    "types_mapping": validator.types_mapping,
+                },
+            )
+        except Unsupported as e:
+            logger.info(f"Validator not compiled, using Cerberus: {e}")
+
+    @property
+    def compiled(self) -> bool:
+        return self._check is not None
+
+    def validate(self, document: Any) -> bool:
+        if self._check is None or not isinstance(document, Mapping):
+            return self.validator.validate(document)
+        try:
+            ok = self._check(document)
+        except _Fallback:
+            return self.validator.validate(document)
+        self._last, self._last_ok = document, ok
+        return ok
+
+    __call__ = validate
+
+    @property
+    def errors(self) -> Any:
+        if self._check is not None and self._last is not None:
+            if self._last_ok:
+                return {}
+            self.validator.validate(self._last)
+            self._last = None
+        return self.validator.errors
+
+
+def compile_validator(validator: Any) -> CompiledValidator:
+    return CompiledValidator(validator)
+
+
+def check_parity(
+    validator: Any,
+    compiled: CompiledValidator,
+    documents: list[Any],
+) -> list[int]:
+    return [
+        i
+        for i, document in enumerate(documents)
+        if compiled.validate(document) != validator.validate(document)
+    ]
+
+
+def benchmark(
+    validator: Any,
+    compiled: CompiledValidator,
+    documents: list[Any],
+    rounds: int = 5,
+) -> dict[str, float]:
+    timings: dict[str, float] = {}
+    for name, validate in (
+        ("cerberus", validator.validate),
+        ("compiled", compiled.validate),
+    ):
+        best = float("inf")
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for document in documents:
+                validate(document)
+            best = min(best, time.perf_counter() - started)
+        timings[f"{name}_us_per_doc"] = best / max(1, len(documents)) * 1e6
+    timings["speedup"] = timings["cerberus_us_per_doc"] / max(
+        timings["compiled_us_per_doc"],
+        1e-9,
+    )
+    return timings